@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: asyncio_calls.py
+
+asyncio implementation of the call timeout, retry and hedging policy
+defined in `call_policy.py`, of calls distributed over a session pool
+defined in `session_pool.py`, of calls limited by the byte budget
+defined in `byte_budget.py` and of identical calls coalesced as described
+in `coalescing.py`.
+
+Semantics equal the Twisted implementation in `deferred_calls.py`.
+Requires Python 3.5 or newer.
+"""
+
+import asyncio
+import copy
+import logging
+
+from mdstudio_cli.byte_budget import BudgetReservation
+from mdstudio_cli.call_policy import CallTimeout
+
+lg = logging.getLogger('clilogger')
+
+
+async def _single_call(call, uri, timeout):
+    """
+    Issue a call once, failing with CallTimeout after `timeout` seconds
+
+    :param call:    function issuing the call and returning an awaitable
+    :type call:     :py:func
+    :param uri:     call URI used in messages
+    :type uri:      :py:str
+    :param timeout: timeout in seconds, None for no timeout
+    :type timeout:  :py:float
+
+    :return:        call result
+    """
+
+    try:
+        return await asyncio.wait_for(call(), timeout)
+    except asyncio.TimeoutError:
+        raise CallTimeout(uri, timeout)
+
+
+async def _hedged_call(call, uri, policy, tracker):
+    """
+    Issue a call and a hedged duplicate when the first one is slow
+
+    The duplicate request is issued when the first one did not return
+    within the hedge delay defined by the policy. The first
+    successful result is used and the other request is cancelled.
+
+    :param call:    function issuing the call and returning an awaitable
+    :type call:     :py:func
+    :param uri:     call URI used in messages
+    :type uri:      :py:str
+    :param policy:  call policy
+    :type policy:   :mdstudio_cli:call_policy:CallPolicy
+    :param tracker: latency observations for the call
+    :type tracker:  :mdstudio_cli:call_policy:LatencyTracker
+
+    :return:        call result
+    """
+
+    hedge_delay = policy.hedge_delay(tracker)
+    if hedge_delay is None:
+        return await _single_call(call, uri, policy.timeout)
+
+    pending = {asyncio.ensure_future(_single_call(call, uri, policy.timeout))}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+        if done:
+            return done.pop().result()
+
+        lg.debug('Issue hedged request for {0} after {1:.3f} sec.'.format(uri, hedge_delay))
+        pending.add(asyncio.ensure_future(_single_call(call, uri, policy.timeout)))
+
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def policy_call(call, uri, policy, tracker=None):
+    """
+    Issue a call according to a call policy
+
+    Applies the policy timeout to every attempt, issues hedged duplicate
+    requests for slow calls and retries failed calls after a jittered
+    exponential backoff delay.
+
+    :param call:    function issuing the call and returning an awaitable.
+                    Called once for every attempt.
+    :type call:     :py:func
+    :param uri:     call URI used in messages
+    :type uri:      :py:str
+    :param policy:  call policy
+    :type policy:   :mdstudio_cli:call_policy:CallPolicy
+    :param tracker: latency observations for the call used for hedging.
+                    Successful call latencies are recorded.
+    :type tracker:  :mdstudio_cli:call_policy:LatencyTracker
+
+    :return:        call result
+    """
+
+    loop = asyncio.get_event_loop()
+
+    attempt = 0
+    while True:
+        start = loop.time()
+        try:
+            result = await _hedged_call(call, uri, policy, tracker)
+        except Exception as error:
+            if attempt >= policy.retries or not policy.is_retryable(error):
+                raise
+
+            delay = policy.backoff_delay(attempt)
+            lg.warning('Call to {0} failed ({1}), retry {2} of {3} in {4:.2f} sec.'.format(
+                uri, error, attempt + 1, policy.retries, delay))
+            await asyncio.sleep(delay)
+            attempt += 1
+        else:
+            if tracker is not None:
+                tracker.record(loop.time() - start)
+            return result
+
+
+async def pool_call(pool, uri, *args, **kwargs):
+    """
+    Issue a WAMP call on the least busy session of a session pool
+
+    The call waits for a session if all sessions in the pool reached their
+    outstanding request limit. It fails with IOError if the pool is closed
+    meanwhile.
+
+    :param pool:    session pool
+    :type pool:     :mdstudio_cli:session_pool:SessionPool
+    :param uri:     endpoint URI to call
+    :type uri:      :py:str
+    :param args:    positional arguments passed to the session `call` method
+    :param kwargs:  keyword arguments passed to the session `call` method.
+                    An optional `dispatched` function is not passed on but
+                    called when the call is handed to a session.
+
+    :return:        call result
+    """
+
+    dispatched = kwargs.pop('dispatched', None)
+    acquired = asyncio.get_event_loop().create_future()
+
+    def assign(session):
+
+        # Pool closed while waiting
+        if session is None:
+            if not acquired.done():
+                acquired.set_exception(IOError('Session pool closed'))
+        elif acquired.done():
+            pool.release(session)
+        else:
+            acquired.set_result(session)
+
+    pool.acquire(assign)
+    try:
+        session = await acquired
+    except asyncio.CancelledError:
+        pool.discard(assign)
+        raise
+
+    if dispatched is not None:
+        dispatched()
+
+    try:
+        return await session.call(uri, *args, **kwargs)
+    finally:
+        pool.release(session)
+
+
+async def budget_call(budget, nbytes, call):
+    """
+    Issue a call once `nbytes` could be reserved from a byte budget
+
+    The call is passed the reservation to charge the size of its result to.
+    The reservation is released when the call finished.
+
+    :param budget:  byte budget
+    :type budget:   :mdstudio_cli:byte_budget:ByteBudget
+    :param nbytes:  number of bytes to reserve
+    :type nbytes:   :py:int
+    :param call:    function returning the call awaitable given the budget
+                    reservation
+    :type call:     :py:func
+
+    :return:        call result
+    """
+
+    acquired = asyncio.get_event_loop().create_future()
+    reservation = BudgetReservation(budget, nbytes)
+
+    def admit():
+
+        if acquired.done():
+            reservation.release()
+        else:
+            acquired.set_result(True)
+
+    budget.acquire(nbytes, admit)
+    try:
+        await acquired
+    except asyncio.CancelledError:
+        if not budget.discard(admit):
+            reservation.release()
+        raise
+
+    try:
+        return await call(reservation)
+    finally:
+        reservation.release()
+
+
+async def coalesced_call(inflight, key, call):
+    """
+    Issue a call or attach to an identical call in flight
+
+    The first caller receives the call result, later callers attached to
+    the same call a deep copy of it. Cancelling one caller does not cancel
+    the shared call.
+
+    :param inflight: calls in flight by key, shared by all callers
+    :type inflight:  :py:dict
+    :param key:      key identifying identical calls
+    :type key:       :py:tuple
+    :param call:     function returning the call awaitable
+    :type call:      :py:func
+
+    :return:         call result
+    """
+
+    result = asyncio.get_event_loop().create_future()
+    if key in inflight:
+        inflight[key].append(result)
+        return await result
+
+    waiters = inflight[key] = [result]
+
+    def fire(task):
+
+        del inflight[key]
+        pending = [waiter for waiter in waiters if not waiter.done()]
+        if task.cancelled():
+            for waiter in pending:
+                waiter.cancel()
+        elif task.exception() is not None:
+            for waiter in pending:
+                waiter.set_exception(task.exception())
+        else:
+            value = task.result()
+            values = [value] + [copy.deepcopy(value) for _ in pending[1:]]
+            for waiter, waiter_value in zip(pending, values):
+                waiter.set_result(waiter_value)
+
+    asyncio.ensure_future(call()).add_done_callback(fire)
+
+    return await result
@@ -0,0 +1,676 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: asyncio_client.py
+
+asyncio execution backend for calling MDStudio microservice endpoints.
+
+Mirrors the Twisted implementation in `wamp_services.py` and `client.py`
+using autobahn's asyncio support: schema retrieval, argument binding,
+endpoint calls using the same call policy and session pool, and result
+processing. The MDStudio component session is Twisted only, the session
+defined here implements the parts of its protocol the CLI needs: WAMP-CRA
+authentication and signed claims.
+
+Requires Python 3.5 or newer.
+
+::
+
+    client = AsyncioMDStudioClient(u'ws://localhost:8080/ws')
+    await client.connect()
+    result = await client.call(u'mdgroup.lie_structures.endpoint.convert', mol='mol.pdb')
+    client.disconnect()
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+import yaml
+
+from autobahn.asyncio.wamp import ApplicationSession, ApplicationRunner
+from autobahn.wamp import auth
+from autobahn.wamp.exception import ApplicationError, TransportLost
+from graphit.graph_io.io_jsonschema_format import read_json_schema
+
+from mdstudio_cli.asyncio_calls import budget_call, coalesced_call, policy_call, pool_call
+from mdstudio_cli.byte_budget import file_content_size, input_size, payload_size, spill_results
+from mdstudio_cli.call_policy import CallTimeout
+from mdstudio_cli.coalescing import request_key
+from mdstudio_cli.metrics import METRICS, COALESCED_CALLS, SCHEMA_FETCH_SECONDS, UPLOADED_BYTES, record_call
+from mdstudio_cli.schema_utils import (BaseSchemaParser, schema_uri_to_dict, dict_to_schema_uri, prepaire_config,
+                                       process_results, write_schema_info, update_catalog)
+from mdstudio_cli.session_pool import SessionPool
+from mdstudio_cli.session_setup import CLIENT_DEFAULTS, setup_session
+
+lg = logging.getLogger('clilogger')
+
+DEFAULT_ROUTER = u'ws://localhost:8080/ws'
+SETTINGS_FILES = ('settings.yml', 'settings.dev.yml')
+SIGN_ENDPOINT = u'mdstudio.auth.endpoint.sign'
+
+
+def load_settings(path=None):
+    """
+    Load MDStudio component settings
+
+    Reads the settings files in the order defined in SETTINGS_FILES, later
+    files update the sections of earlier ones. Like MDStudio components
+    the files are looked up in the current working directory by default.
+
+    :param path: directory containing the settings files, defaults to the
+                 current working directory
+    :type path:  :py:str
+
+    :return:     settings by section
+    :rtype:      :py:dict
+    """
+
+    path = path or os.getcwd()
+
+    settings = {}
+    for name in SETTINGS_FILES:
+        settings_file = os.path.join(path, name)
+        if os.path.isfile(settings_file):
+            with open(settings_file) as inf:
+                for section, values in (yaml.safe_load(inf) or {}).items():
+                    settings.setdefault(section, {}).update(values or {})
+
+    return settings
+
+
+def check_settings(settings):
+    """
+    Check the component settings required to connect to MDStudio
+
+    :param settings: settings by section as returned by `load_settings`
+    :type settings:  :py:dict
+
+    :raises:         AttributeError if the session credentials or the
+                     vendor are not defined
+    """
+
+    session_settings = settings.get('session') or {}
+    missing = ['session.{0}'.format(key) for key in ('username', 'password') if not session_settings.get(key)]
+    if not (settings.get('static') or {}).get('vendor'):
+        missing.append('static.vendor')
+
+    if missing:
+        raise AttributeError('MDStudio {0} not defined. "settings.yml" file may be missing'.format(
+                             ', '.join(missing)))
+
+
+class GroupContext(object):
+    """
+    Issue calls with claims for a MDStudio group
+    """
+
+    def __init__(self, session, group):
+
+        self.session = session
+        self.group = group
+
+    def call(self, procedure, request, claims=None, **kwargs):
+
+        claims = dict(claims or {})
+        claims[u'group'] = self.group
+
+        return self.session.call(procedure, request, claims=claims, **kwargs)
+
+
+class AsyncioCliSession(ApplicationSession):
+    """
+    asyncio WAMP session for the MDStudio CLI
+
+    Authenticates using WAMP-CRA and signs call claims with the MDStudio
+    auth endpoint like the MDStudio component session. Adds itself to the
+    session pool and notifies the client passed in the component config
+    `extra` once joined.
+    """
+
+    def onConnect(self):
+
+        self.join(self.config.realm, authmethods=[u'wampcra'], authid=self.config.extra['username'])
+
+    def onChallenge(self, challenge):
+
+        if challenge.method != u'wampcra':
+            raise IOError('Unsupported authentication method: {0}'.format(challenge.method))
+
+        signature = auth.compute_wcs(self.config.extra['password'].encode('utf8'),
+                                     challenge.extra['challenge'].encode('utf8'))
+        return signature.decode('ascii')
+
+    async def onJoin(self, details):
+
+        # Pool closed while connecting
+        if self.config.extra.get('pool') is not None and not self.config.extra['pool'].add(self):
+            self.leave()
+            return
+        if self.config.extra.get('client') is not None:
+            self.config.extra['client'].session_ready(self)
+
+    def onLeave(self, details):
+
+        if self.config.extra.get('pool') is not None:
+            self.config.extra['pool'].remove(self)
+        if self.config.extra.get('client') is not None:
+            self.config.extra['client'].session_lost(self, IOError('Session left realm {0}: {1} {2}'.format(
+                                                     self.config.realm, details.reason, details.message or '')))
+        self.disconnect()
+
+    def onDisconnect(self):
+
+        if self.config.extra.get('client') is not None:
+            self.config.extra['client'].session_lost(self, IOError('Disconnected from router'))
+
+    def group_context(self, group):
+
+        return GroupContext(self, group)
+
+    async def call(self, procedure, request, claims=None, **kwargs):
+        """
+        Call a MDStudio endpoint with signed claims
+
+        :param procedure: endpoint URI
+        :type procedure:  :py:str
+        :param request:   endpoint input
+        :type request:    :py:dict
+        :param claims:    claims to sign
+        :type claims:     :py:dict
+
+        :return:          endpoint results
+        """
+
+        signed_claims = await super(AsyncioCliSession, self).call(SIGN_ENDPOINT, dict(claims or {}))
+        return await super(AsyncioCliSession, self).call(procedure, request, signed_claims=signed_claims, **kwargs)
+
+
+class AsyncioSchemaParser(BaseSchemaParser):
+    """
+    MDStudio WAMP JSON Schema parser for asyncio sessions
+    """
+
+    async def _recursive_schema_call(self, uri_dict):
+        """
+        Recursivly obtain endpoint schema's
+
+        A schema already being retrieved is waited for instead of retrieved
+        again.
+
+        :param uri_dict: dictionary from the `schema_uri_to_dict` function
+                         describing WAMP JSON Schema URI.
+        :type uri_dict:  :py:dict
+        """
+
+        uri = dict_to_schema_uri(uri_dict)
+        if uri not in self._schema_cache:
+
+            def call():
+                return self.session.group_context(self.vendor).call(self.schema_endpoint, uri_dict,
+                                                                    claims={u'vendor': self.vendor})
+
+            async def fetch():
+                start = time.time()
+                try:
+                    response = await policy_call(call, uri, self.policy, tracker=self.latency)
+                except Exception as error:
+                    lg.error('Unable to retrieve schema: {0}. {1}'.format(uri, error))
+                    raise
+                SCHEMA_FETCH_SECONDS.observe(time.time() - start)
+
+                self._schema_cache[uri] = response
+                for ref in set(self._get_refs(response)):
+                    await self._recursive_schema_call(schema_uri_to_dict(ref))
+
+            await coalesced_call(self._schema_requests, uri, fetch)
+
+    async def get(self, uri, clean_cache=True, **kwargs):
+        """
+        Retrieve the JSON Schema describing an MDStudio endpoint (request or
+        response) or resource based on a WAMP or MDStudio schema URI.
+
+        :param uri:         MDStudio endpoint or resource JSON Schema URI to
+                            retrieve
+        :type uri:          :py:str
+        :param clean_cache: clean the uri cache used to limit calls to the
+                            same uri
+        :type clean_cache:  :py:bool
+        :param kwargs:      additional keyword arguments are passed to the
+                            `schema_uri_to_dict` function
+        :type kwargs:       :py:dict
+
+        :return:            Schema
+        """
+
+        uri_dict = schema_uri_to_dict(uri, **kwargs)
+        uri = dict_to_schema_uri(uri_dict)
+
+        if clean_cache:
+            self._schema_cache = {}
+
+        await self._recursive_schema_call(uri_dict)
+        return self._build_schema(self._schema_cache.get(uri, {}))
+
+
+class AsyncioMDStudioClient(object):
+    """
+    asyncio Python client to MDStudio microservice endpoints
+
+    asyncio counterpart of `mdstudio_cli.client.MDStudioClient`. Uses the
+    router credentials, vendor and `cli_pool` session pool configuration
+    from the component settings files.
+    """
+
+    def __init__(self, url=DEFAULT_ROUTER, realm=u'mdstudio', settings=None, **config):
+        """
+        :param url:      MDStudio router WAMP websocket URL
+        :type url:       :py:str
+        :param realm:    WAMP realm to join
+        :type realm:     :py:str
+        :param settings: component settings, loaded from the settings files
+                         by default
+        :type settings:  :py:dict
+        :param config:   call policy options (call_timeout, schema_timeout,
+                         retries, backoff, hedge) and file_cache and
+                         max_inflight sizes equal to the `mdstudio-cli`
+                         command line options. Client only options are
+                         spill_threshold and coalesce, see CLIENT_DEFAULTS.
+        """
+
+        self.url = url
+        self.realm = realm
+        self.settings = settings if settings is not None else load_settings()
+        self.config = dict(CLIENT_DEFAULTS)
+        self.config.update(config)
+
+        self.session = None
+        self.pool = None
+        self.pool_connecting = None
+        self.schema_parser = None
+        self._ready = None
+
+    @property
+    def connected(self):
+        """
+        Client has a session ready for calls
+        """
+
+        return self.session is not None
+
+    def _open_session(self, url, **extra):
+
+        session_settings = self.settings.get('session', {})
+        extra.update({'pool': self.pool, 'username': session_settings.get('username'),
+                      'password': session_settings.get('password')})
+
+        runner = ApplicationRunner(url, self.realm, extra=extra)
+        return runner.run(AsyncioCliSession, start_loop=False)
+
+    async def connect(self):
+        """
+        Connect to the MDStudio router
+
+        The additional sessions of the session pool are opened by the first
+        endpoint call.
+
+        :return: the client once the session is ready for calls
+        """
+
+        check_settings(self.settings)
+
+        static = self.settings.get('static', {})
+        pool_settings = static.get('cli_pool') or {}
+
+        self.pool = SessionPool(max_outstanding=pool_settings.get('max_outstanding', 8))
+        self.pool_connecting = None
+        self._ready = asyncio.get_event_loop().create_future()
+
+        # Join is rejected or never completes, fail instead of waiting forever
+        await self._open_session(self.url, client=self)
+        try:
+            await asyncio.wait_for(self._ready, self.config.get('schema_timeout'))
+        except asyncio.TimeoutError:
+            raise IOError('Unable to join realm {0} at {1} within {2} sec.'.format(
+                          self.realm, self.url, self.config['schema_timeout']))
+
+        schema_policy = setup_session(self, self.config, retry_exceptions=(CallTimeout, TransportLost))
+        self.schema_parser = AsyncioSchemaParser(self.session, policy=schema_policy, vendor=static.get('vendor'))
+
+        return self
+
+    def open_pool(self):
+        """
+        Open the additional sessions of the session pool
+
+        Sessions are opened once for the router URL's listed in the
+        `cli_pool` section of the static settings, see
+        `CliWampApi.open_pool`.
+
+        :return: session pool
+        :rtype:  :mdstudio_cli:session_pool:SessionPool
+        """
+
+        if self.pool_connecting is not None:
+            return self.pool
+
+        pool_settings = self.settings.get('static', {}).get('cli_pool') or {}
+
+        def connect_failed(task, url):
+            if not task.cancelled() and task.exception() is not None:
+                lg.error('Unable to open pool session to router {0}: {1}'.format(url, task.exception()))
+
+        self.pool_connecting = []
+        for url in pool_settings.get('routers') or []:
+            for _ in range(pool_settings.get('sessions', 1)):
+                task = asyncio.ensure_future(self._open_session(url))
+                task.add_done_callback(lambda t, url=url: connect_failed(t, url))
+                self.pool_connecting.append(task)
+
+        return self.pool
+
+    def session_ready(self, session):
+        """
+        Called by the client session once it is ready for calls
+
+        :param session: ready WAMP session
+        :type session:  :mdstudio_cli:asyncio_client:AsyncioCliSession
+        """
+
+        # Connect failed or timed out meanwhile
+        if self._ready is None or self._ready.done():
+            session.leave()
+            return
+
+        self.session = session
+        self._ready.set_result(session)
+
+    def session_lost(self, session, error):
+        """
+        Called by the client session when it leaves or is disconnected
+
+        Fails a pending `connect` with `error`.
+
+        :param session: WAMP session
+        :type session:  :mdstudio_cli:asyncio_client:AsyncioCliSession
+        :param error:   reason the session was lost
+        :type error:    :py:Exception
+        """
+
+        if session is self.session:
+            self.session = None
+        if self._ready is not None and not self._ready.done():
+            self._ready.set_exception(error)
+
+    def _check_connected(self):
+
+        if self.session is None:
+            raise IOError('AsyncioMDStudioClient not connected, call connect() first')
+
+    async def schema(self, uri):
+        """
+        Get the ORM enabled request JSON Schema graph for an endpoint
+
+        Schemas are cached by endpoint URI and compiled graphs are persisted
+        in the schema graph cache. Concurrent requests for a schema not yet
+        cached share a single retrieval. Every call returns a new graph so
+        endpoint input can be set without affecting other calls.
+
+        :param uri: endpoint URI
+        :type uri:  :py:str
+
+        :return:    request schema graph
+        """
+
+        self._check_connected()
+
+        async def fetch():
+            schema = await self.schema_parser.get(uri=uri, request=True, clean_cache=False)
+            self._request_schemas[uri] = schema
+
+            # Register endpoint in the local endpoint catalog
+            update_catalog(self.catalog, uri, self.schema_graphs.get(uri, schema, read_json_schema))
+
+        if uri not in self._request_schemas:
+            await coalesced_call(self._schema_requests, uri, fetch)
+
+        request = self.schema_graphs.get(uri, self._request_schemas[uri], read_json_schema)
+        request.data['file_cache'] = self.file_cache
+
+        return request
+
+    async def call_bound(self, uri, endpoint_input):
+        """
+        Call an endpoint with input bound to its request schema
+
+        The call is issued on the least busy pool session according to the
+        session call policy. File content is counted as uploaded for every
+        attempt handed to a session.
+
+        :param uri:            endpoint URI
+        :type uri:             :py:str
+        :param endpoint_input: endpoint input
+        :type endpoint_input:  :py:dict
+
+        :return:               endpoint results
+        """
+
+        pool = self.open_pool()
+        uploaded = file_content_size(endpoint_input)
+
+        def sent():
+            UPLOADED_BYTES.inc(uploaded)
+
+        start = time.time()
+        try:
+            result = await policy_call(lambda: pool_call(pool, uri, endpoint_input, dispatched=sent), uri,
+                                       self.call_policy, tracker=self.latency)
+        except Exception as error:
+            record_call(time.time() - start, error=error)
+            raise
+
+        record_call(time.time() - start)
+        return result
+
+    async def call_endpoint(self, uri, package_config, process=None):
+        """
+        Call an endpoint with input bound to its request schema
+
+        The input is bound once the estimated payload size fits the in-flight
+        byte budget. The result size is charged to the budget until the
+        result was processed by `process` and returned. With coalescing
+        enabled, the call attaches to an identical call in flight if any and
+        returns its payload reservation as it sends nothing.
+
+        :param uri:            endpoint URI
+        :type uri:             :py:str
+        :param package_config: endpoint arguments by (dot separated) argument
+                               path as accepted on the command line
+        :type package_config:  :py:dict
+        :param process:        function called with the endpoint results,
+                               its return value is the call result
+        :type process:         :py:func
+
+        :return:               endpoint results
+        """
+
+        self._check_connected()
+
+        async def bind_and_call(reservation):
+            request = await self.schema(uri)
+            endpoint_input = prepaire_config(request, package_config)
+
+            if self.coalesce:
+                key = request_key(uri, endpoint_input)
+                if key in self._inflight:
+                    COALESCED_CALLS.inc()
+                    reservation.release()
+                result = await coalesced_call(self._inflight, key, lambda: self.call_bound(uri, endpoint_input))
+            else:
+                result = await self.call_bound(uri, endpoint_input)
+
+            reservation.charge(payload_size(result))
+            if process is not None:
+                result = process(result)
+
+            return result
+
+        return await budget_call(self.budget, input_size(package_config), bind_and_call)
+
+    async def call(self, uri, arguments=None, **kwargs):
+        """
+        Call an endpoint
+
+        With `coalesce` enabled, a call with the same bound input as a call
+        in flight attaches to that call and receives a copy of its result.
+        The call waits while the `max_inflight` byte budget is used up.
+
+        :param uri:       endpoint URI
+        :type uri:        :py:str
+        :param arguments: endpoint arguments by (dot separated) argument path
+        :type arguments:  :py:dict
+        :param kwargs:    additional endpoint arguments
+
+        :return:          endpoint results dictionary
+        """
+
+        package_config = dict(arguments or {})
+        package_config.update(kwargs)
+
+        return await self.call_endpoint(uri, package_config)
+
+    async def map(self, uri, inputs):
+        """
+        Call an endpoint for every set of arguments in `inputs`
+
+        Calls are issued concurrently and distributed over the session pool.
+        Results wait for all calls to finish. With a `spill_threshold`, result
+        file content larger than the threshold is meanwhile written to a
+        temporary file referenced by the `spilled` key of the file object and
+        its `content` is None.
+
+        :param uri:    endpoint URI
+        :type uri:     :py:str
+        :param inputs: endpoint arguments dictionaries
+        :type inputs:  :py:list
+
+        :return:       endpoint results in `inputs` order. Raises the first
+                       failing call.
+        """
+
+        def spill(result):
+            return spill_results(result, self.spill_threshold)
+
+        return await asyncio.gather(*[self.call_endpoint(uri, dict(arguments), process=spill) for arguments in inputs])
+
+    def disconnect(self):
+        """
+        Leave the client session and pool sessions
+
+        Pool sessions still connecting are cancelled or leave once joined.
+        The event loop is left running.
+        """
+
+        for task in self.pool_connecting or []:
+            task.cancel()
+        self.pool_connecting = None
+
+        sessions = self.pool.close() if self.pool is not None else []
+        if self.session is not None and self.session not in sessions:
+            sessions.append(self.session)
+
+        for session in sessions:
+            if session.is_attached():
+                session.leave()
+
+        self.session = None
+        self._ready = None
+
+
+async def run_cli(config):
+    """
+    Run a `mdstudio-cli` command using the asyncio backend
+
+    :param config:  CLI configuration as returned by `mdstudio_cli_parser`
+    :type config:   :py:dict
+
+    :return:        True if the command succeeded
+    :rtype:         :py:bool
+    """
+
+    client = AsyncioMDStudioClient(url=config.get('router') or DEFAULT_ROUTER, **config)
+
+    # Periodically write run metrics
+    metrics_writer = None
+    if config.get('metrics') and config.get('metrics_interval'):
+        metrics_writer = asyncio.ensure_future(write_metrics_periodically(config['metrics'],
+                                                                          config['metrics_interval']))
+
+    try:
+        await client.connect()
+
+        if config['get_endpoint_info']:
+            request = await client.schema(config['uri'])
+            write_schema_info(request, config['uri'])
+        else:
+            def result_callback(result):
+
+                # Store results as JSON
+                if config.get('store_json', False):
+                    result_json = os.path.join(os.getcwd(), '{0}.json'.format(config['uri']))
+                    json.dump(result, open(result_json, 'w'))
+
+                # Process file-like output and print remaining.
+                process_results(result)
+
+            await client.call_endpoint(config['uri'], config['package_config'], process=result_callback)
+
+    except Exception as error:
+        failure_message = error.error_message() if isinstance(error, ApplicationError) else str(error)
+        lg.error('Unable to process: {0}'.format(failure_message))
+        return False
+
+    finally:
+        client.disconnect()
+        if metrics_writer is not None:
+            metrics_writer.cancel()
+        if config.get('metrics'):
+            METRICS.write(config['metrics'])
+
+    return True
+
+
+async def write_metrics_periodically(path, interval):
+    """
+    Write run metrics to file every `interval` seconds until cancelled
+
+    :param path:     metrics file path
+    :type path:      :py:str
+    :param interval: write interval in seconds
+    :type interval:  :py:float
+    """
+
+    while True:
+        await asyncio.sleep(interval)
+        METRICS.write(path)
+
+
+def cli_main_asyncio(config):
+    """
+    Run a `mdstudio-cli` command in a new asyncio event loop
+
+    :param config:  CLI configuration as returned by `mdstudio_cli_parser`
+    :type config:   :py:dict
+
+    :return:        True if the command succeeded
+    :rtype:         :py:bool
+    """
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(run_cli(config))
+    finally:
+        loop.close()
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: byte_budget.py
+
+Limit the memory held by endpoint calls in flight.
+
+Calls reserve the estimated size of their request payload from a shared
+byte budget before the input is bound. The size of the result is charged
+to the same reservation once received and all is released when the result
+was processed or returned to the caller. Calls that do not fit the
+remaining budget wait in first-in first-out order. Large file content in
+results can be spilled to temporary files so it does not stay resident
+while results wait to be processed.
+"""
+
+import os
+import logging
+import tempfile
+
+from collections import deque
+
+lg = logging.getLogger('clilogger')
+
+# Keys defining a file object in endpoint input or results
+FILE_OBJ_KEYS = {u'extension', u'encoding', u'content', u'path'}
+
+
+def byte_length(value):
+    """
+    Length in bytes of a string as sent over the wire
+
+    Text is counted by its UTF-8 encoded length.
+
+    :param value:   text or bytes
+    :type value:    :py:str
+
+    :rtype:         :py:int
+    """
+
+    if isinstance(value, bytes):
+        return len(value)
+
+    return len(value.encode('utf-8'))
+
+
+def payload_size(payload):
+    """
+    Estimate the size of a request or result payload in bytes
+
+    Counts the encoded length of all string values in (nested) dictionaries
+    and lists.
+
+    :param payload: request or result payload
+    :type payload:  :py:dict
+
+    :rtype:         :py:int
+    """
+
+    if isinstance(payload, dict):
+        return sum(payload_size(value) for value in payload.values())
+    if isinstance(payload, (list, tuple)):
+        return sum(payload_size(value) for value in payload)
+    if isinstance(payload, (bytes, type(u''))):
+        return byte_length(payload)
+
+    return 0
+
+
+def file_content_size(payload):
+    """
+    Size in bytes of the file content in a request or result payload
+
+    :param payload: request or result payload
+    :type payload:  :py:dict
+
+    :rtype:         :py:int
+    """
+
+    if isinstance(payload, dict):
+        if FILE_OBJ_KEYS.issubset(payload.keys()):
+            content = payload[u'content']
+            return byte_length(content) if isinstance(content, (bytes, type(u''))) else 0
+        return sum(file_content_size(value) for value in payload.values())
+    if isinstance(payload, (list, tuple)):
+        return sum(file_content_size(value) for value in payload)
+
+    return 0
+
+
+def input_size(package_config):
+    """
+    Estimate the payload size of endpoint arguments before binding them
+
+    Arguments referring to a file are counted by file size as their content
+    is added to the payload when bound.
+
+    :param package_config: endpoint arguments by (dot separated) argument
+                           path
+    :type package_config:  :py:dict
+
+    :rtype:                :py:int
+    """
+
+    size = 0
+    for value in package_config.values():
+        if isinstance(value, (bytes, type(u''))) and os.path.isfile(value):
+            size += os.path.getsize(value)
+        else:
+            size += payload_size(value)
+
+    return size
+
+
+def spill_results(results, threshold):
+    """
+    Move large file content in endpoint results to temporary files
+
+    The `content` of a file object larger than `threshold` bytes is written
+    to a temporary file and replaced by None. The temporary file path is
+    stored as `spilled` in the file object. Spilled files are moved to their
+    final location by `process_results`.
+
+    :param results:   endpoint results, updated in place
+    :type results:    :py:dict
+    :param threshold: content size in bytes above which to spill, None to
+                      disable spilling
+    :type threshold:  :py:int
+
+    :return:          results
+    :rtype:           :py:dict
+    """
+
+    if threshold is None:
+        return results
+
+    def spill(node):
+
+        if isinstance(node, dict):
+            content = node.get(u'content')
+            if FILE_OBJ_KEYS.issubset(node.keys()) and content is not None and byte_length(content) > threshold:
+                handle, path = tempfile.mkstemp(prefix='mdstudio_cli_', suffix='.{0}'.format(node[u'extension']))
+                with os.fdopen(handle, 'w') as outf:
+                    outf.write(content)
+
+                lg.debug('Spilled {0} bytes of result content to {1}'.format(len(content), path))
+                node[u'content'] = None
+                node[u'spilled'] = path
+
+            for value in node.values():
+                spill(value)
+
+        elif isinstance(node, list):
+            for value in node:
+                spill(value)
+
+    spill(results)
+    return results
+
+
+class ByteBudget(object):
+    """
+    First-in first-out admission of work limited by a byte budget
+
+    Work is admitted while the reserved bytes stay within `max_bytes`. Work
+    larger than the full budget is admitted once nothing else is reserved
+    so it never waits forever. Like `SessionPool` the budget is event loop
+    agnostic, work is submitted as a callback that is called once admitted.
+    """
+
+    def __init__(self, max_bytes=None):
+        """
+        :param max_bytes: maximum number of bytes reserved at once. None for
+                          no limit.
+        :type max_bytes:  :py:int
+        """
+
+        self.max_bytes = max_bytes
+        self.used = 0
+
+        self._waiting = deque()
+
+    @property
+    def waiting(self):
+        """
+        Number of requests waiting for budget
+        """
+
+        return len(self._waiting)
+
+    def _fits(self, nbytes):
+
+        return self.max_bytes is None or not self.used or self.used + nbytes <= self.max_bytes
+
+    def _dispatch(self):
+
+        while self._waiting and self._fits(self._waiting[0][0]):
+            nbytes, callback = self._waiting.popleft()
+            self.used += nbytes
+            callback()
+
+    def acquire(self, nbytes, callback):
+        """
+        Reserve bytes from the budget
+
+        `callback` is called without arguments directly if the reservation
+        fits the budget, else once enough bytes are released.
+
+        :param nbytes:   number of bytes to reserve
+        :type nbytes:    :py:int
+        :param callback: function to call once the bytes are reserved
+        :type callback:  :py:func
+        """
+
+        self._waiting.append((nbytes, callback))
+        self._dispatch()
+
+    def discard(self, callback):
+        """
+        Withdraw a reservation still waiting for budget
+
+        :param callback: callback submitted using `acquire`
+        :type callback:  :py:func
+
+        :return:         True if the reservation was still waiting
+        :rtype:          :py:bool
+        """
+
+        for entry in self._waiting:
+            if entry[1] is callback:
+                self._waiting.remove(entry)
+                return True
+
+        return False
+
+    def release(self, nbytes):
+        """
+        Return reserved bytes to the budget
+
+        :param nbytes: number of bytes reserved using `acquire`
+        :type nbytes:  :py:int
+        """
+
+        self.used = max(0, self.used - nbytes)
+        self._dispatch()
+
+
+class BudgetReservation(object):
+    """
+    Bytes reserved from a byte budget by a call in flight
+
+    Created by `budget_call` once the request payload size was reserved.
+    The call charges the size of its result to the reservation while it is
+    held and the reservation is released when the call finished.
+    """
+
+    def __init__(self, budget, nbytes):
+        """
+        :param budget: byte budget the bytes are reserved from
+        :type budget:  :mdstudio_cli:byte_budget:ByteBudget
+        :param nbytes: number of bytes reserved
+        :type nbytes:  :py:int
+        """
+
+        self.budget = budget
+        self.nbytes = nbytes
+
+    def charge(self, nbytes):
+        """
+        Charge bytes held by the call to the reservation
+
+        Charged bytes are not waited for, they delay calls waiting for
+        budget until released.
+
+        :param nbytes: number of bytes
+        :type nbytes:  :py:int
+        """
+
+        self.budget.used += nbytes
+        self.nbytes += nbytes
+
+    def release(self):
+        """
+        Return all reserved and charged bytes to the budget
+        """
+
+        nbytes, self.nbytes = self.nbytes, 0
+        if nbytes:
+            self.budget.release(nbytes)
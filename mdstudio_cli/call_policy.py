@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: call_policy.py
+
+Timeout, retry and hedging policy for calls to MDStudio WAMP endpoints.
+
+The policy itself is event loop agnostic. The Twisted and asyncio
+implementations that apply it to WAMP calls are found in `deferred_calls.py`
+and `asyncio_calls.py`.
+"""
+
+import bisect
+import random
+
+from collections import deque
+
+# WAMP error URI's signaling transient router side failures worth a retry
+RETRYABLE_ERRORS = (u'wamp.error.canceled', u'wamp.error.timeout', u'wamp.error.no_such_procedure',
+                    u'wamp.error.no_available_callee')
+
+
+class CallTimeout(Exception):
+    """
+    Raised when a WAMP call did not return within the policy timeout
+    """
+
+    def __init__(self, uri, timeout):
+
+        super(CallTimeout, self).__init__('Call to {0} timed out after {1:.2f} seconds'.format(uri, timeout))
+        self.uri = uri
+        self.timeout = timeout
+
+
+class LatencyTracker(object):
+    """
+    Track call latencies over a sliding window of observations
+
+    Used to derive the delay after which a hedged duplicate request is
+    issued from a latency percentile.
+    """
+
+    def __init__(self, window=1000):
+        """
+        :param window: maximum number of latency observations to keep
+        :type window:  :py:int
+        """
+
+        self._window = deque(maxlen=window)
+        self._sorted = []
+
+    def __len__(self):
+
+        return len(self._window)
+
+    def record(self, latency):
+        """
+        Record a call latency
+
+        :param latency: call latency in seconds
+        :type latency:  :py:float
+        """
+
+        if len(self._window) == self._window.maxlen:
+            oldest = self._window[0]
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+
+        self._window.append(latency)
+        bisect.insort(self._sorted, latency)
+
+    def percentile(self, percentile):
+        """
+        Latency at a given percentile of the observations
+
+        :param percentile: percentile between 0 and 100
+        :type percentile:  :py:float
+
+        :return:           latency or None if no observations
+        :rtype:            :py:float
+        """
+
+        if not self._sorted:
+            return None
+
+        index = int(round((len(self._sorted) - 1) * min(max(percentile, 0), 100) / 100.0))
+        return self._sorted[index]
+
+
+class CallPolicy(object):
+    """
+    Timeout, retry and hedging settings for WAMP calls
+
+    Retries and hedged requests issue the same call more than once and
+    should only be enabled for idempotent endpoints. Schema retrieval is
+    always idempotent.
+    """
+
+    def __init__(self, timeout=None, retries=0, backoff=0.5, max_backoff=30.0, hedge_percentile=None,
+                 hedge_min_samples=20, fixed_hedge_delay=None, retry_exceptions=(CallTimeout,),
+                 retry_errors=RETRYABLE_ERRORS):
+        """
+        :param timeout:           call timeout in seconds, None for no timeout
+        :type timeout:            :py:float
+        :param retries:           number of retries after a failed call
+        :type retries:            :py:int
+        :param backoff:           base delay in seconds for exponential backoff
+        :type backoff:            :py:float
+        :param max_backoff:       upper limit to the backoff delay
+        :type max_backoff:        :py:float
+        :param hedge_percentile:  issue a hedged duplicate request when the
+                                  call takes longer than this latency
+                                  percentile. None disables hedging.
+        :type hedge_percentile:   :py:float
+        :param hedge_min_samples: minimum number of latency observations
+                                  required before hedging
+        :type hedge_min_samples:  :py:int
+        :param fixed_hedge_delay: issue a hedged duplicate request after
+                                  this many seconds while there are too few
+                                  latency observations or without a
+                                  `hedge_percentile`. None disables it.
+        :type fixed_hedge_delay:  :py:float
+        :param retry_exceptions:  exception classes that trigger a retry
+        :type retry_exceptions:   :py:tuple
+        :param retry_errors:      WAMP ApplicationError URI's that trigger
+                                  a retry
+        :type retry_errors:       :py:tuple
+        """
+
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.fixed_hedge_delay = fixed_hedge_delay
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.retry_errors = tuple(retry_errors)
+
+    @classmethod
+    def from_config(cls, config, timeout_key='call_timeout', **kwargs):
+        """
+        Build a policy from the CLI configuration dictionary
+
+        :param config:      CLI configuration as returned by
+                            `mdstudio_cli_parser`
+        :type config:       :py:dict
+        :param timeout_key: configuration key holding the timeout
+        :type timeout_key:  :py:str
+        :param kwargs:      additional keyword arguments passed to the
+                            CallPolicy constructor
+
+        :rtype:             :mdstudio_cli:call_policy:CallPolicy
+        """
+
+        settings = dict(timeout=config.get(timeout_key), retries=config.get('retries') or 0,
+                        backoff=config.get('backoff') or 0.5, hedge_percentile=config.get('hedge'),
+                        fixed_hedge_delay=config.get('hedge_delay'))
+        settings.update(kwargs)
+
+        return cls(**settings)
+
+    def is_retryable(self, error):
+        """
+        Check if a failed call may be retried
+
+        :param error: exception raised by the call
+        :type error:  :py:Exception
+
+        :rtype:       :py:bool
+        """
+
+        if isinstance(error, self.retry_exceptions):
+            return True
+
+        # autobahn ApplicationError exposes the error URI as `error`
+        return getattr(error, 'error', None) in self.retry_errors
+
+    def backoff_delay(self, attempt):
+        """
+        Jittered exponential backoff delay before a retry
+
+        Uses 'full jitter': a random delay between zero and the exponential
+        backoff for the attempt, capped at `max_backoff`.
+
+        :param attempt: zero based retry attempt number
+        :type attempt:  :py:int
+
+        :return:        delay in seconds
+        :rtype:         :py:float
+        """
+
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def hedge_delay(self, tracker):
+        """
+        Delay after which a hedged duplicate request is issued
+
+        The latency percentile once there are enough observations, else the
+        fixed hedge delay.
+
+        :param tracker: latency observations for the call
+        :type tracker:  :mdstudio_cli:call_policy:LatencyTracker
+
+        :return:        delay in seconds or None if hedging is disabled
+        :rtype:         :py:float
+        """
+
+        if self.hedge_percentile is None or tracker is None or len(tracker) < self.hedge_min_samples:
+            return self.fixed_hedge_delay
+
+        return tracker.percentile(self.hedge_percentile)
+
+
+def call_policies(config, retry_exceptions=(CallTimeout,)):
+    """
+    Build the endpoint call and schema retrieval call policies
+
+    Schema retrieval is idempotent and is retried at least twice.
+    Endpoint calls are only retried or hedged on request.
+
+    :param config:           CLI configuration
+    :type config:            :py:dict
+    :param retry_exceptions: exception classes that trigger a retry
+    :type retry_exceptions:  :py:tuple
+
+    :return:                 endpoint call policy and schema call policy
+    :rtype:                  :py:tuple
+    """
+
+    call_policy = CallPolicy.from_config(config, retry_exceptions=retry_exceptions)
+    schema_policy = CallPolicy.from_config(config, timeout_key='schema_timeout', retry_exceptions=retry_exceptions,
+                                           retries=max(config.get('retries') or 0, 2))
+
+    return call_policy, schema_policy
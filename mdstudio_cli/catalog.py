@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: catalog.py
+
+Local catalog of MDStudio endpoints and their arguments.
+
+The catalog is built from the endpoint request schemas fetched by the CLI
+and persisted as JSON in the CLI cache directory. It supports offline
+endpoint search and `--info` lookups and fast shell completion of endpoint
+URI's and argument names. This module is deliberately light on imports to
+keep shell completion fast.
+"""
+
+import json
+import logging
+import os
+import sys
+
+from mdstudio_cli.cli_parser import MODES, cli_option_strings
+from mdstudio_cli.io_utils import cache_dir, atomic_write, makedirs
+
+lg = logging.getLogger('clilogger')
+
+CATALOG_FILE = 'catalog.json'
+CATALOG_VERSION = 1
+
+
+def write_endpoint_info(entry, uri):
+    """
+    Write print friendly version of a catalog endpoint entry to stdout
+
+    :param entry:   catalog endpoint entry
+    :type entry:    :py:dict
+    :param uri:     Endpoint URI
+    :type uri:      :py:str
+    """
+
+    lg.info('\nAPI definition for endpoint: {0}\n'.format(uri))
+    lg.info('Title:       {0}'.format(entry.get('title', '')))
+    lg.info('Description: {0}'.format(entry.get('description', '')))
+
+    # Print endpoint argument description
+    lg.info('\nArguments:')
+    arguments = entry.get('arguments', {})
+    for arg in sorted(arguments):
+
+        pr = arguments[arg]
+        required = 'REQUIRED' if pr.get('required', False) else ''
+        lg.info('  --{0:<30}  {1:<8}  {2:<8}  {3:<8}  {4}'.format(arg, required, pr.get('type', ''),
+                                                                str(pr.get('default', '')), pr.get('description', '')))
+
+
+class EndpointCatalog(object):
+    """
+    Persisted index of endpoints and their flattened argument paths
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: catalog file path, defaults to catalog.json in the CLI
+                     cache directory
+        :type path:  :py:str
+        """
+
+        self.path = path or os.path.join(cache_dir(), CATALOG_FILE)
+        self.endpoints = {}
+        self._changed = {}
+
+        self.load()
+
+    def __contains__(self, uri):
+
+        return uri in self.endpoints
+
+    def __len__(self):
+
+        return len(self.endpoints)
+
+    def load(self):
+        """
+        Load the catalog from file. A missing or unreadable catalog is empty
+
+        A corrupt catalog file is moved aside to '<path>.corrupt' so it is
+        not overwritten by the next save.
+        """
+
+        self.endpoints = self._read()
+        self.endpoints.update(self._changed)
+
+    def _read(self):
+
+        if not os.path.isfile(self.path):
+            return {}
+
+        try:
+            with open(self.path) as inf:
+                catalog = json.load(inf)
+        except IOError:
+            lg.debug('Unable to read endpoint catalog: {0}'.format(self.path))
+            return {}
+        except ValueError as error:
+            self._move_corrupt(error)
+            return {}
+
+        if not isinstance(catalog, dict):
+            self._move_corrupt('not a JSON object')
+            return {}
+
+        if catalog.get('version') != CATALOG_VERSION:
+            return {}
+
+        return catalog.get('endpoints', {})
+
+    def _move_corrupt(self, error):
+
+        corrupt = u'{0}.corrupt'.format(self.path)
+        try:
+            os.rename(self.path, corrupt)
+        except OSError as rename_error:
+            lg.warning('Corrupt endpoint catalog {0} ({1}), unable to move it aside: {2}'.format(
+                self.path, error, rename_error))
+        else:
+            lg.warning('Corrupt endpoint catalog {0} ({1}) moved to {2}'.format(self.path, error, corrupt))
+
+    def save(self):
+        """
+        Save the catalog to file
+
+        Endpoints added since loading are merged with the catalog on disk
+        so concurrent CLI runs do not lose each others updates. The cache
+        directory is created if needed.
+
+        :raises IOError, OSError: if the catalog could not be written
+        """
+
+        endpoints = self._read()
+        endpoints.update(self._changed)
+        makedirs(os.path.dirname(os.path.abspath(self.path)))
+        atomic_write(self.path, json.dumps({'version': CATALOG_VERSION, 'endpoints': endpoints}, sort_keys=True))
+
+        self.endpoints = endpoints
+        self._changed = {}
+
+    def add(self, uri, entry):
+        """
+        Add or update an endpoint
+
+        :param uri:   endpoint URI
+        :type uri:    :py:str
+        :param entry: endpoint entry as build by `schema_catalog_entry`
+        :type entry:  :py:dict
+        """
+
+        self.endpoints[uri] = entry
+        self._changed[uri] = entry
+
+    def get(self, uri):
+        """
+        Get the catalog entry for an endpoint
+
+        :param uri: endpoint URI
+        :type uri:  :py:str
+
+        :return:    endpoint entry or None
+        :rtype:     :py:dict
+        """
+
+        return self.endpoints.get(uri)
+
+    def search(self, term=None):
+        """
+        Search endpoints by URI, title, description or argument name
+
+        :param term: case insensitive search term, all endpoints if None
+        :type term:  :py:str
+
+        :return:     sorted matching endpoint URI's
+        :rtype:      :py:list
+        """
+
+        if not term:
+            return sorted(self.endpoints)
+
+        term = term.lower()
+        matches = []
+        for uri, entry in self.endpoints.items():
+            text = [uri, entry.get('title', ''), entry.get('description', '')] + list(entry.get('arguments', {}))
+            if any(term in str(value).lower() for value in text):
+                matches.append(uri)
+
+        return sorted(matches)
+
+    def uris(self, prefix=''):
+        """
+        Endpoint URI's starting with prefix
+
+        :rtype: :py:list
+        """
+
+        return sorted(uri for uri in self.endpoints if uri.startswith(prefix))
+
+    def arguments(self, uri, prefix=''):
+        """
+        Argument paths of an endpoint starting with prefix
+
+        :rtype: :py:list
+        """
+
+        entry = self.endpoints.get(uri) or {}
+        return sorted(arg for arg in entry.get('arguments', {}) if arg.startswith(prefix))
+
+
+def catalog_main(config):
+    """
+    Search the local endpoint catalog or print an endpoint definition from it
+
+    Runs without connecting to MDStudio.
+
+    :param config:  CLI configuration as returned by `mdstudio_cli_parser`
+    :type config:   :py:dict
+
+    :return:        True if the lookup succeeded
+    :rtype:         :py:bool
+    """
+
+    catalog = EndpointCatalog()
+
+    if config['mode'] == u'catalog':
+        for uri in catalog.search(config['search']):
+            lg.info('{0:<50}  {1}'.format(uri, catalog.get(uri).get('title', '')))
+        return True
+
+    entry = catalog.get(config['uri'])
+    if entry is None:
+        lg.error('Endpoint not in local catalog: {0}. Run with --info to fetch it'.format(config['uri']))
+        return False
+
+    write_endpoint_info(entry, config['uri'])
+    return True
+
+
+def complete(words, current, previous, options=(), catalog=None):
+    """
+    Shell completion candidates for the mdstudio-cli command line
+
+    :param words:    command line words up to the cursor
+    :type words:     :py:list
+    :param current:  word being completed
+    :type current:   :py:str
+    :param previous: word before the word being completed
+    :type previous:  :py:str
+    :param options:  CLI option strings
+    :type options:   :py:list
+    :param catalog:  endpoint catalog, loaded from the default location if
+                     not defined
+    :type catalog:   :mdstudio_cli:catalog:EndpointCatalog
+
+    :return:         completion candidates
+    :rtype:          :py:list
+    """
+
+    catalog = catalog if catalog is not None else EndpointCatalog()
+
+    # CLI mode as first argument
+    if len(words) == 2 and not current.startswith('-'):
+        return [mode for mode in MODES if mode.startswith(current)]
+
+    # Endpoint URI's
+    if previous in ('-u', '--uri'):
+        return catalog.uris(current)
+
+    # CLI options and arguments of the endpoint on the command line
+    if current.startswith('-'):
+        uri = None
+        for i, word in enumerate(words[:-1]):
+            if word in ('-u', '--uri'):
+                uri = words[i + 1]
+
+        candidates = sorted(options)
+        if uri is not None:
+            candidates += ['--{0}'.format(arg) for arg in catalog.arguments(uri)]
+
+        return [candidate for candidate in candidates if candidate.startswith(current)]
+
+    return []
+
+
+def complete_main():
+    """
+    Shell completion entry point, installed as `mdstudio-cli-complete`
+
+    Implements the bash `complete -C` protocol, enable it using:
+    ::
+        complete -C mdstudio-cli-complete mdstudio-cli
+
+    Candidates are printed one per line.
+    """
+
+    line = os.environ.get('COMP_LINE', '')
+    point = int(os.environ.get('COMP_POINT', len(line)))
+
+    current = sys.argv[2] if len(sys.argv) > 2 else ''
+    previous = sys.argv[3] if len(sys.argv) > 3 else ''
+
+    words = line[:point].split()
+    if not current:
+        words.append(current)
+
+    for candidate in complete(words, current, previous, options=cli_option_strings(words)):
+        sys.stdout.write('{0}\n'.format(candidate))
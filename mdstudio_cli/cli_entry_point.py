@@ -8,10 +8,9 @@ Requires the /bin directory of the Python version used to isntall the package
 to be available in the users PATH.
 """
 
-from mdstudio.runner import main
-
-from mdstudio_cli.wamp_services import CliWampApi
 from mdstudio_cli.cli_parser import mdstudio_cli_parser
+from mdstudio_cli.catalog import catalog_main
+from mdstudio_cli.profiling import profiled
 
 import logging
 import sys
@@ -33,4 +32,45 @@ def cli_main():
     # Parse command line arguments
     config = mdstudio_cli_parser()
 
-    main(CliWampApi, auto_reconnect=False, log_level=config['log_level'], extra=config, daily_log=False)
+    # Search the local endpoint catalog or get the method API from it without connecting
+    if config['mode'] == 'catalog' or config.get('offline'):
+        sys.exit(not catalog_main(config))
+
+    # Profile the run, including the event loop, if requested
+    if config.get('profile'):
+        with profiled(config['profile'], path=config.get('profile_output')):
+            succeeded = run_backend(config)
+    else:
+        succeeded = run_backend(config)
+
+    sys.exit(not succeeded)
+
+
+def run_backend(config):
+    """
+    Run the event loop of the selected backend until the command finished
+
+    :param config:  CLI configuration as returned by `mdstudio_cli_parser`
+    :type config:   :py:dict
+
+    :return:        True if the command succeeded
+    :rtype:         :py:bool
+    """
+
+    # autobahn binds to a single event loop framework per process, import
+    # only the selected backend. The asyncio backend requires Python 3.5.
+    if config['backend'] == 'asyncio':
+        from mdstudio_cli.asyncio_client import cli_main_asyncio
+        return cli_main_asyncio(config)
+
+    from mdstudio.runner import main
+    from mdstudio_cli.wamp_services import CliWampApi
+
+    # Set by the session, the status dictionary is shared with the session
+    # configuration even if the runner copies it. Unset if the session never
+    # completed the command.
+    status = {}
+    main(CliWampApi, auto_reconnect=False, log_level=config['log_level'], extra=dict(config, run_status=status),
+         daily_log=False)
+
+    return status.get('succeeded', False)
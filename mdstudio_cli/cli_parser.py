@@ -14,11 +14,32 @@ MDStudio command line interface.
 
 Call a method exposed by a MDStudio microservice using it's public URI
 
+Load test a method at a target rate or concurrency using:
+
+    mdstudio-cli loadtest -u <uri> --cli_duration <sec> --cli_rate <calls/sec> <method arguments>
+
+Search the local catalog of endpoints called before using:
+
+    mdstudio-cli catalog <search term>
+
+Options starting with --cli_ configure the CLI, all other options are passed
+to the method as arguments.
 """
 
 # If file path, read file content and transport "over wire"
 PARSE_FILES = True
 
+# CLI modes selected by the first command line argument
+MODES = (u'loadtest', u'catalog')
+
+# Option prefix reserved for CLI options. Other unknown options are endpoint
+# arguments, CLI options are therefore never abbreviated.
+CLI_PREFIX = '--cli_'
+
+# Session options shared by the command line and the Python clients
+SESSION_DEFAULTS = {u'call_timeout': None, u'schema_timeout': 30.0, u'retries': 0, u'backoff': 0.5, u'hedge': None,
+                    u'hedge_delay': None, u'file_cache': 64, u'max_inflight': 256}
+
 
 def _commandline_arg_py2(bytestring):
     """
@@ -104,31 +125,184 @@ def _parse_variable_arguments(args, prefix='-'):
     return method_args
 
 
-def mdstudio_cli_parser():
+class CliArgumentParser(argparse.ArgumentParser):
     """
-    Command Line Interface parser
+    Argument parser matching long options by their full name only
 
-    Builds the CLI parser used by the mdstudio_cli script
+    argparse matches unique abbreviations of long options by default, which
+    would capture endpoint arguments that are a prefix of a CLI option.
+    Equals `allow_abbrev=False` that is not available on Python 2.7.
+    """
+
+    def _get_option_tuples(self, option_string):
+
+        if option_string.startswith('--'):
+            return []
+
+        return super(CliArgumentParser, self)._get_option_tuples(option_string)
+
+
+def _build_parser(mode=u'call'):
+    """
+    Build the argparse parser for a CLI mode
+
+    :param mode: CLI mode, 'call' or one of MODES
+    :type mode:  :py:str
+
+    :rtype:      :py:argparse.ArgumentParser
     """
 
     # Create the top-level parser
-    parser = argparse.ArgumentParser(prog="MDStudio", usage=USAGE, description="MDStudio CLI")
+    parser = CliArgumentParser(prog="MDStudio", usage=USAGE, description="MDStudio CLI")
+
+    # Search the local endpoint catalog
+    if mode == u'catalog':
+        parser.add_argument('search', type=_commandline_arg, nargs='?', default=None,
+                            help='Search endpoint URI, title, description or arguments')
+        return parser
 
     # Parse application session and microservice WAMP arguments
     parser.add_argument('-u', '--uri', type=_commandline_arg, dest='uri', required=True, help='Microservice method URI')
     parser.add_argument('-i', '--info', action='store_true', dest='get_endpoint_info', help='Get method API')
     parser.add_argument('-j', '--store_json', action='store_true', dest="store_json", help='Store results as JSON')
     parser.add_argument('-l', '--log', type=_commandline_arg, dest='log_level', default='none', help='Log level')
+    parser.add_argument('--cli_offline', action='store_true', dest='offline',
+                        help='Get method API from the local endpoint catalog, requires -i')
+
+    parser.add_argument('--cli_backend', choices=('twisted', 'asyncio'), dest='backend', default='twisted',
+                        help='Event loop used to run the call')
+    parser.add_argument('--cli_router', type=_commandline_arg, dest='router', default=None,
+                        help='Router WAMP websocket URL for the asyncio backend')
+
+    # Call timeout, retry and hedging policy
+    parser.add_argument('--cli_call_timeout', type=float, dest='call_timeout',
+                        default=SESSION_DEFAULTS['call_timeout'],
+                        help='Endpoint call timeout in seconds')
+    parser.add_argument('--cli_schema_timeout', type=float, dest='schema_timeout',
+                        default=SESSION_DEFAULTS['schema_timeout'],
+                        help='Schema retrieval timeout in seconds')
+    parser.add_argument('--cli_retries', type=int, dest='retries', default=SESSION_DEFAULTS['retries'],
+                        help='Retry failed calls to idempotent endpoints')
+    parser.add_argument('--cli_backoff', type=float, dest='backoff', default=SESSION_DEFAULTS['backoff'],
+                        help='Base delay in seconds for exponential retry backoff')
+    parser.add_argument('--cli_hedge', type=float, dest='hedge', default=SESSION_DEFAULTS['hedge'],
+                        help='Issue hedged duplicate requests to idempotent endpoints after this latency percentile')
+    parser.add_argument('--cli_hedge_delay', type=float, dest='hedge_delay',
+                        default=SESSION_DEFAULTS['hedge_delay'],
+                        help='Issue hedged duplicate requests after this many seconds until there are enough '
+                             'latencies for --cli_hedge')
+
+    parser.add_argument('--cli_file_cache', type=float, dest='file_cache',
+                        default=SESSION_DEFAULTS['file_cache'],
+                        help='Size limit in MB of the session cache of input file content')
+
+    parser.add_argument('--cli_max_inflight', type=float, dest='max_inflight',
+                        default=SESSION_DEFAULTS['max_inflight'],
+                        help='Pause new calls while this many MB of request payload are in flight')
+
+    # Profiling
+    parser.add_argument('--cli_profile', choices=('cpu', 'mem'), dest='profile', default=None,
+                        help='Profile CPU time or memory allocations of the run')
+    parser.add_argument('--cli_profile_output', type=_commandline_arg, dest='profile_output', default=None,
+                        help='Profile output file, defaults to mdstudio_cli.pstats or mdstudio_cli.tracemalloc')
+
+    # Run metrics export
+    parser.add_argument('--cli_metrics', type=_commandline_arg, dest='metrics', default=None,
+                        help='Write run metrics to file in OpenMetrics text format')
+    parser.add_argument('--cli_metrics_interval', type=float, dest='metrics_interval', default=None,
+                        help='Also write run metrics every given number of seconds')
+
+    # Load test options
+    if mode == u'loadtest':
+        parser.add_argument('--cli_duration', type=float, dest='duration', default=10.0,
+                            help='Load test duration in seconds')
+        parser.add_argument('--cli_rate', type=float, dest='rate', default=None,
+                            help='Target number of calls started per second')
+        parser.add_argument('--cli_concurrency', type=int, dest='concurrency', default=None,
+                            help='Number of calls in flight, maximum number when combined with --cli_rate')
+
+    return parser
+
+
+def _split_mode(argv):
+    """
+    Split the CLI mode from the command line arguments
+
+    :param argv: command line arguments without program name
+    :type argv:  :py:list
+
+    :return:     CLI mode and remaining arguments
+    :rtype:      :py:tuple
+    """
+
+    if argv and argv[0] in MODES:
+        return argv[0], argv[1:]
 
-    if len(sys.argv) == 1:
+    return u'call', argv
+
+
+def cli_option_strings(words):
+    """
+    Option strings accepted by the CLI used for shell completion
+
+    :param words: command line words including program name
+    :type words:  :py:list
+
+    :rtype:       :py:list
+    """
+
+    mode, _ = _split_mode(words[1:])
+    return [option for option in _build_parser(mode)._option_string_actions if option.startswith('--')]
+
+
+def mdstudio_cli_parser(argv=None):
+    """
+    Command Line Interface parser
+
+    Builds the CLI parser used by the mdstudio_cli script.
+    A first 'loadtest' argument selects the load test mode, a first
+    'catalog' argument searches the local endpoint catalog.
+
+    :param argv: command line arguments, defaults to sys.argv
+    :type argv:  :py:list
+
+    :return:     parsed command line options
+    :rtype:      :py:dict
+    """
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    mode, argv = _split_mode(argv)
+    parser = _build_parser(mode)
+
+    if not argv and mode != u'catalog':
         parser.print_help(sys.stderr)
         sys.exit(1)
 
+    if mode == u'catalog':
+        options = vars(parser.parse_args(argv))
+        options['mode'] = mode
+        return options
+
     # parse command line arguments
-    options, method_args = parser.parse_known_args()
+    options, method_args = parser.parse_known_args(argv)
 
     # Convert argparse NameSpace object to dict
     options = vars(options)
+    options['mode'] = mode
+
+    if mode == u'loadtest' and options['backend'] != 'twisted':
+        parser.error('loadtest is only supported by the twisted backend')
+
+    # Only the method API is available offline
+    if options['offline'] and not options['get_endpoint_info']:
+        parser.error('--cli_offline requires -i/--info')
+
+    # Reserved for the CLI, most likely a misspelled CLI option
+    reserved = [arg for arg in method_args if arg.split('=')[0].startswith(CLI_PREFIX)]
+    if reserved:
+        parser.error('unrecognized CLI options: {0}'.format(' '.join(reserved)))
 
     # Parse all unknown arguments. These are the keyword arguments passed to
     # the microservice method
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: client.py
+
+Embeddable Python client to MDStudio microservice endpoints.
+
+The client keeps a single WAMP session, its session pool and endpoint
+schema cache alive for any number of calls. Unlike the `mdstudio-cli`
+command line tool it does not start or stop the Twisted reactor, the
+event loop lifecycle is managed by the caller:
+
+::
+
+    from twisted.internet import task
+
+    @chainable
+    def run(reactor):
+        client = MDStudioClient(u'ws://localhost:8080/ws')
+        yield client.connect()
+
+        result = yield client.call(u'mdgroup.lie_structures.endpoint.convert',
+                                   mol='mol.pdb', output_format='mol2')
+        results = yield client.map(u'mdgroup.lie_structures.endpoint.convert',
+                                   [{'mol': 'mol1.pdb'}, {'mol': 'mol2.pdb'}])
+        client.disconnect()
+
+    task.react(run)
+"""
+
+import logging
+
+from twisted.internet import defer
+
+from mdstudio_cli.byte_budget import spill_results
+from mdstudio_cli.session_setup import CLIENT_DEFAULTS
+
+lg = logging.getLogger('clilogger')
+
+
+class MDStudioClient(object):
+    """
+    Python client to MDStudio microservice endpoints
+
+    Endpoint arguments are bound to the endpoint request schema the same way
+    as command line arguments to `mdstudio-cli`: file paths for file-like
+    arguments are read and send over the wire, nested arguments are
+    addressed by their dot separated path.
+    """
+
+    def __init__(self, url=u'ws://localhost:8080/ws', realm=u'mdstudio', **config):
+        """
+        :param url:    MDStudio router WAMP websocket URL
+        :type url:     :py:str
+        :param realm:  WAMP realm to join
+        :type realm:   :py:str
+        :param config: call policy options (call_timeout, schema_timeout,
+                       retries, backoff, hedge) and file_cache and
+                       max_inflight sizes equal to the `mdstudio-cli`
+                       command line options. Client only options are
+                       spill_threshold and coalesce, see CLIENT_DEFAULTS.
+        """
+
+        self.url = url
+        self.realm = realm
+        self.config = dict(CLIENT_DEFAULTS)
+        self.config.update(config)
+
+        self.session = None
+        # Twisted reactor or clock timing the connect, defaults to the reactor
+        self.clock = None
+        self._ready = None
+
+    @property
+    def connected(self):
+        """
+        Client has a session ready for calls
+        """
+
+        return self.session is not None
+
+    def _open_session(self):
+
+        # autobahn binds to a single event loop framework per process, import
+        # the Twisted session only once it is used
+        from autobahn.twisted.wamp import ApplicationRunner
+        from mdstudio_cli.wamp_services import CliWampApi
+
+        runner = ApplicationRunner(self.url, self.realm, extra=dict(self.config, client=self))
+        return runner.run(CliWampApi, start_reactor=False, auto_reconnect=False)
+
+    def connect(self):
+        """
+        Connect to the MDStudio router
+
+        Requires a running Twisted reactor to complete. Fails with IOError
+        when joining the realm is rejected or does not complete within
+        `schema_timeout` seconds.
+
+        :return: Twisted deferred firing with the client once the session
+                 is ready for calls
+        :rtype:  :twisted:internet:defer:Deferred
+        """
+
+        if self._ready is None:
+            self._ready = defer.Deferred()
+
+            def connect_failed(failure):
+                self._fail_ready(failure)
+
+            def timed_out():
+                self._fail_ready(IOError('Unable to join realm {0} at {1} within {2} sec.'.format(
+                                 self.realm, self.url, self.config['schema_timeout'])))
+
+            # Join is rejected or never completes, fail instead of waiting forever
+            if self.config.get('schema_timeout'):
+                clock = self.clock
+                if clock is None:
+                    from twisted.internet import reactor as clock
+                timer = clock.callLater(self.config['schema_timeout'], timed_out)
+
+                def stop_timer(result):
+                    if timer.active():
+                        timer.cancel()
+                    return result
+
+                self._ready.addBoth(stop_timer)
+
+            self._open_session().addErrback(connect_failed)
+
+        return self._ready
+
+    def _fail_ready(self, error):
+
+        ready = self._ready
+        if ready is not None and not ready.called:
+            self._ready = None
+            ready.errback(error)
+
+    def session_ready(self, session):
+        """
+        Called by the client session once it is ready for calls
+
+        :param session: ready WAMP session
+        :type session:  :mdstudio_cli:wamp_services:CliWampApi
+        """
+
+        # Connect failed, timed out or disconnected meanwhile
+        if self._ready is None or self._ready.called:
+            session.leave()
+            return
+
+        self.session = session
+        self._ready.callback(self)
+
+    def session_lost(self, session, error):
+        """
+        Called by the client session when it leaves or is disconnected
+
+        Fails a pending `connect` with `error`, a later `connect` opens a
+        new session.
+
+        :param session: WAMP session
+        :type session:  :mdstudio_cli:wamp_services:CliWampApi
+        :param error:   reason the session was lost
+        :type error:    :py:Exception
+        """
+
+        if session is self.session:
+            self.session = None
+            self._ready = None
+
+        self._fail_ready(error)
+
+    def _check_connected(self):
+
+        if self.session is None:
+            raise IOError('MDStudioClient not connected, call connect() first')
+
+    def schema(self, uri):
+        """
+        Get the request JSON Schema graph for an endpoint
+
+        :param uri: endpoint URI
+        :type uri:  :py:str
+
+        :return:    request schema graph as Twisted deferred object
+        """
+
+        self._check_connected()
+        return self.session.request_schema(uri)
+
+    def call(self, uri, arguments=None, **kwargs):
+        """
+        Call an endpoint
+
+        With `coalesce` enabled, a call with the same bound input as a call
+        in flight attaches to that call and receives a copy of its result.
+        The call waits while the `max_inflight` byte budget is used up.
+
+        :param uri:       endpoint URI
+        :type uri:        :py:str
+        :param arguments: endpoint arguments by (dot separated) argument path
+        :type arguments:  :py:dict
+        :param kwargs:    additional endpoint arguments
+
+        :return:          endpoint results dictionary as Twisted deferred
+                          object
+        """
+
+        self._check_connected()
+
+        package_config = dict(arguments or {})
+        package_config.update(kwargs)
+
+        return self.session.call_endpoint(uri, package_config)
+
+    def map(self, uri, inputs):
+        """
+        Call an endpoint for every set of arguments in `inputs`
+
+        Calls are issued concurrently and distributed over the session pool.
+        Results wait for all calls to finish. With a `spill_threshold`, result
+        file content larger than the threshold is meanwhile written to a
+        temporary file referenced by the `spilled` key of the file object and
+        its `content` is None.
+
+        :param uri:    endpoint URI
+        :type uri:     :py:str
+        :param inputs: endpoint arguments dictionaries
+        :type inputs:  :py:list
+
+        :return:       endpoint results in `inputs` order as Twisted deferred
+                       object. Fails with the first failing call.
+        """
+
+        self._check_connected()
+
+        def spill(result):
+            return spill_results(result, self.session.spill_threshold)
+
+        return defer.gatherResults([defer.maybeDeferred(self.session.call_endpoint, uri, dict(arguments),
+                                                        process=spill) for arguments in inputs],
+                                   consumeErrors=True)
+
+    def disconnect(self):
+        """
+        Disconnect the client session and pool sessions
+
+        The Twisted reactor is left running.
+        """
+
+        if self.session is not None:
+            self.session.close_pool()
+            self.session.disconnect()
+
+        self.session = None
+        self._ready = None
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: coalescing.py
+
+Coalesce identical endpoint calls in flight.
+
+Calls to the same endpoint URI with the same bound input share a single
+router call. The Twisted and asyncio implementations are `coalesced_call`
+in `deferred_calls.py` and `asyncio_calls.py` respectively. The first
+caller receives the call result, every other caller a deep copy of it so
+results can be processed independently.
+"""
+
+import hashlib
+import json
+
+
+def request_key(uri, payload):
+    """
+    Key identifying identical endpoint calls
+
+    :param uri:     endpoint URI
+    :type uri:      :py:str
+    :param payload: bound endpoint input as returned by `prepaire_config`
+    :type payload:  :py:dict
+
+    :return:        endpoint URI and SHA1 hex digest of the canonical JSON
+                    representation of the payload
+    :rtype:         :py:tuple
+    """
+
+    content = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return uri, hashlib.sha1(content.encode('utf-8')).hexdigest()
@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: deferred_calls.py
+
+Twisted implementation of the call timeout, retry and hedging policy
+defined in `call_policy.py`, of calls distributed over a session pool
+defined in `session_pool.py`, of calls limited by the byte budget
+defined in `byte_budget.py` and of identical calls coalesced as described
+in `coalescing.py`.
+"""
+
+import copy
+import logging
+
+from twisted.internet import defer, task
+from twisted.python.failure import Failure
+
+from mdstudio.deferred.chainable import chainable
+from mdstudio.deferred.return_value import return_value
+
+from mdstudio_cli.byte_budget import BudgetReservation
+from mdstudio_cli.call_policy import CallTimeout
+
+lg = logging.getLogger('clilogger')
+
+
+def _default_clock(clock=None):
+    """
+    Return `clock` or the Twisted reactor if not defined
+
+    The reactor is imported when first needed as importing it installs the
+    default reactor, preventing the caller to install another one.
+
+    :param clock:   Twisted reactor or clock
+
+    :return:        Twisted reactor or clock
+    """
+
+    if clock is None:
+        from twisted.internet import reactor
+        clock = reactor
+
+    return clock
+
+
+def _single_call(call, uri, timeout, clock):
+    """
+    Issue a call once, failing with CallTimeout after `timeout` seconds
+
+    :param call:    function issuing the call and returning a deferred
+    :type call:     :py:func
+    :param uri:     call URI used in messages
+    :type uri:      :py:str
+    :param timeout: timeout in seconds, None for no timeout
+    :type timeout:  :py:float
+    :param clock:   Twisted reactor or clock
+
+    :return:        deferred firing with the call result
+    :rtype:         :twisted:internet:defer:Deferred
+    """
+
+    timer = []
+
+    def cancel_inner(deferred):
+
+        if timer and timer[0].active():
+            timer[0].cancel()
+        cancel = getattr(inner, 'cancel', None)
+        if cancel is not None:
+            cancel()
+
+    result = defer.Deferred(cancel_inner)
+
+    def on_result(value):
+
+        if timer and timer[0].active():
+            timer[0].cancel()
+        if not result.called:
+            result.callback(value)
+
+    def on_failure(failure):
+
+        if timer and timer[0].active():
+            timer[0].cancel()
+        if not result.called:
+            result.errback(failure)
+
+    def on_timeout():
+
+        if not result.called:
+            result.errback(CallTimeout(uri, timeout))
+            cancel = getattr(inner, 'cancel', None)
+            if cancel is not None:
+                cancel()
+
+    inner = call()
+    inner.addCallbacks(on_result, on_failure)
+    if timeout and not result.called:
+        timer.append(clock.callLater(timeout, on_timeout))
+
+    return result
+
+
+def _hedged_call(call, uri, policy, tracker, clock):
+    """
+    Issue a call and a hedged duplicate when the first one is slow
+
+    The duplicate request is issued when the first one did not return
+    within the hedge delay defined by the policy. The first
+    successful result is used and the other request is cancelled.
+
+    :param call:    function issuing the call and returning a deferred
+    :type call:     :py:func
+    :param uri:     call URI used in messages
+    :type uri:      :py:str
+    :param policy:  call policy
+    :type policy:   :mdstudio_cli:call_policy:CallPolicy
+    :param tracker: latency observations for the call
+    :type tracker:  :mdstudio_cli:call_policy:LatencyTracker
+    :param clock:   Twisted reactor or clock
+
+    :rtype:         :twisted:internet:defer:Deferred
+    """
+
+    hedge_delay = policy.hedge_delay(tracker)
+    if hedge_delay is None:
+        return _single_call(call, uri, policy.timeout, clock)
+
+    result = defer.Deferred()
+    pending = []
+
+    def on_result(value, deferred):
+
+        if deferred in pending:
+            pending.remove(deferred)
+        if hedge.active():
+            hedge.cancel()
+        if result.called:
+            return
+
+        result.callback(value)
+        losers = list(pending)
+        del pending[:]
+        for loser in losers:
+            loser.cancel()
+
+    def on_failure(failure, deferred):
+
+        if deferred in pending:
+            pending.remove(deferred)
+        if result.called or pending:
+            return
+
+        if hedge.active():
+            hedge.cancel()
+        result.errback(failure)
+
+    def launch():
+
+        if pending:
+            lg.debug('Issue hedged request for {0} after {1:.3f} sec.'.format(uri, hedge_delay))
+
+        deferred = _single_call(call, uri, policy.timeout, clock)
+        pending.append(deferred)
+        deferred.addCallbacks(on_result, on_failure, callbackArgs=(deferred,), errbackArgs=(deferred,))
+
+    hedge = clock.callLater(hedge_delay, launch)
+    launch()
+
+    return result
+
+
+@chainable
+def policy_call(call, uri, policy, tracker=None, clock=None):
+    """
+    Issue a call according to a call policy
+
+    Applies the policy timeout to every attempt, issues hedged duplicate
+    requests for slow calls and retries failed calls after a jittered
+    exponential backoff delay.
+
+    :param call:    function issuing the call and returning a deferred.
+                    Called once for every attempt.
+    :type call:     :py:func
+    :param uri:     call URI used in messages
+    :type uri:      :py:str
+    :param policy:  call policy
+    :type policy:   :mdstudio_cli:call_policy:CallPolicy
+    :param tracker: latency observations for the call used for hedging.
+                    Successful call latencies are recorded.
+    :type tracker:  :mdstudio_cli:call_policy:LatencyTracker
+    :param clock:   Twisted reactor or clock, defaults to the reactor
+
+    :return:        call result as Twisted deferred object
+    """
+
+    clock = _default_clock(clock)
+
+    attempt = 0
+    while True:
+        start = clock.seconds()
+        try:
+            result = yield _hedged_call(call, uri, policy, tracker, clock)
+        except Exception as error:
+            if attempt >= policy.retries or not policy.is_retryable(error):
+                raise
+
+            delay = policy.backoff_delay(attempt)
+            lg.warning('Call to {0} failed ({1}), retry {2} of {3} in {4:.2f} sec.'.format(
+                uri, error, attempt + 1, policy.retries, delay))
+            yield task.deferLater(clock, delay, lambda: None)
+            attempt += 1
+        else:
+            if tracker is not None:
+                tracker.record(clock.seconds() - start)
+            return_value(result)
+
+
+def pool_call(pool, uri, *args, **kwargs):
+    """
+    Issue a WAMP call on the least busy session of a session pool
+
+    The call waits for a session if all sessions in the pool reached their
+    outstanding request limit. It fails with IOError if the pool is closed
+    meanwhile.
+
+    :param pool:    session pool
+    :type pool:     :mdstudio_cli:session_pool:SessionPool
+    :param uri:     endpoint URI to call
+    :type uri:      :py:str
+    :param args:    positional arguments passed to the session `call` method
+    :param kwargs:  keyword arguments passed to the session `call` method.
+                    An optional `dispatched` function is not passed on but
+                    called when the call is handed to a session.
+
+    :return:        call result as Twisted deferred object
+    :rtype:         :twisted:internet:defer:Deferred
+    """
+
+    dispatched = kwargs.pop('dispatched', None)
+    running = []
+
+    def cancel(deferred):
+
+        if not pool.discard(run) and running:
+            running[0].cancel()
+
+    result = defer.Deferred(cancel)
+
+    def release(value, session):
+
+        pool.release(session)
+        if not result.called:
+            if isinstance(value, Failure):
+                result.errback(value)
+            else:
+                result.callback(value)
+
+    def run(session):
+
+        # Pool closed while waiting
+        if session is None:
+            if not result.called:
+                result.errback(IOError('Session pool closed'))
+            return
+
+        if result.called:
+            pool.release(session)
+            return
+
+        if dispatched is not None:
+            dispatched()
+
+        try:
+            deferred = session.call(uri, *args, **kwargs)
+        except Exception:
+            pool.release(session)
+            result.errback()
+            return
+
+        running.append(deferred)
+        deferred.addBoth(release, session)
+
+    pool.acquire(run)
+
+    return result
+
+
+def budget_call(budget, nbytes, call):
+    """
+    Issue a call once `nbytes` could be reserved from a byte budget
+
+    The call is passed the reservation to charge the size of its result to.
+    The reservation is released when the call finished.
+
+    :param budget:  byte budget
+    :type budget:   :mdstudio_cli:byte_budget:ByteBudget
+    :param nbytes:  number of bytes to reserve
+    :type nbytes:   :py:int
+    :param call:    function issuing the call given the budget reservation
+                    and returning a deferred
+    :type call:     :py:func
+
+    :return:        call result as Twisted deferred object
+    :rtype:         :twisted:internet:defer:Deferred
+    """
+
+    running = []
+    reservation = BudgetReservation(budget, nbytes)
+
+    def cancel(deferred):
+
+        if not budget.discard(run) and running:
+            running[0].cancel()
+
+    result = defer.Deferred(cancel)
+
+    def release(value):
+
+        reservation.release()
+        if not result.called:
+            if isinstance(value, Failure):
+                result.errback(value)
+            else:
+                result.callback(value)
+
+    def run():
+
+        if result.called:
+            reservation.release()
+            return
+
+        deferred = defer.maybeDeferred(call, reservation)
+        running.append(deferred)
+        deferred.addBoth(release)
+
+    budget.acquire(nbytes, run)
+
+    return result
+
+
+def coalesced_call(inflight, key, call):
+    """
+    Issue a call or attach to an identical call in flight
+
+    The first caller receives the call result, later callers attached to
+    the same call a deep copy of it. Cancelling one caller does not cancel
+    the shared call.
+
+    :param inflight: calls in flight by key, shared by all callers
+    :type inflight:  :py:dict
+    :param key:      key identifying identical calls
+    :type key:       :py:tuple
+    :param call:     function issuing the call and returning a deferred
+    :type call:      :py:func
+
+    :return:         call result as Twisted deferred object
+    :rtype:          :twisted:internet:defer:Deferred
+    """
+
+    result = defer.Deferred()
+    if key in inflight:
+        inflight[key].append(result)
+        return result
+
+    waiters = inflight[key] = [result]
+
+    def fire(value):
+
+        del inflight[key]
+        pending = [waiter for waiter in waiters if not waiter.called]
+        if isinstance(value, Failure):
+            for waiter in pending:
+                waiter.errback(value)
+            return
+
+        values = [value] + [copy.deepcopy(value) for _ in pending[1:]]
+        for waiter, waiter_value in zip(pending, values):
+            waiter.callback(waiter_value)
+
+    defer.maybeDeferred(call).addBoth(fire)
+
+    return result
+
+
+def run_load(call, stats, duration, rate=None, concurrency=None, clock=None):
+    """
+    Drive a call at a target rate or concurrency for a fixed duration
+
+    With a `rate` calls are started at a fixed interval (open loop), the
+    optional `concurrency` then caps the number of calls in flight and
+    calls that would exceed it are counted as dropped. Intervals missed
+    while the reactor was busy start their calls late. Without a rate,
+    `concurrency` calls are kept in flight (closed loop).
+
+    Call latency is timed from the moment the call is handed to a session,
+    the time spent waiting for the byte budget and a pool session before
+    is recorded as queue wait. `call` is passed a function to call at that
+    moment, see the `dispatched` argument of `pool_call`. Latency of calls
+    failing before being handed to a session is timed from their start.
+
+    :param call:        function issuing the call given the dispatch
+                        function and returning a deferred
+    :type call:         :py:func
+    :param stats:       load test statistics to record calls in
+    :type stats:        :mdstudio_cli:loadtest:LoadTestStats
+    :param duration:    duration in seconds during which calls are started
+    :type duration:     :py:float
+    :param rate:        target number of calls started per second
+    :type rate:         :py:float
+    :param concurrency: target or maximum number of calls in flight
+    :type concurrency:  :py:int
+    :param clock:       Twisted reactor or clock, defaults to the reactor
+
+    :return:            deferred firing with `stats` when all started calls
+                        finished
+    :rtype:             :twisted:internet:defer:Deferred
+    """
+
+    clock = _default_clock(clock)
+
+    finished = defer.Deferred()
+    state = {'inflight': 0, 'stopped': False}
+    ticker = None
+
+    def check_finished():
+
+        if state['stopped'] and not state['inflight'] and not finished.called:
+            stats.stop(clock.seconds())
+            finished.callback(stats)
+
+    def completed(_):
+
+        state['inflight'] -= 1
+        if rate is None and not state['stopped']:
+            clock.callLater(0, launch)
+        check_finished()
+
+    def launch():
+
+        if state['stopped']:
+            return
+
+        state['inflight'] += 1
+        start = clock.seconds()
+        timing = {}
+
+        def dispatched():
+            timing.setdefault('dispatched', clock.seconds())
+
+        def record(result):
+            error = result.value if isinstance(result, Failure) else None
+            sent = timing.get('dispatched')
+            queue_wait = sent - start if sent is not None else None
+            stats.record(clock.seconds() - (sent if sent is not None else start), error=error,
+                         queue_wait=queue_wait)
+
+        deferred = defer.maybeDeferred(call, dispatched)
+        deferred.addBoth(record)
+        deferred.addBoth(completed)
+
+    def tick(count):
+
+        # Ticks missed while the reactor was busy are launched late
+        for _ in range(count):
+            if concurrency and state['inflight'] >= concurrency:
+                stats.dropped += 1
+            else:
+                launch()
+
+    def stop():
+
+        state['stopped'] = True
+        if ticker is not None and ticker.running:
+            ticker.stop()
+        check_finished()
+
+    stats.start(clock.seconds())
+    clock.callLater(duration, stop)
+
+    if rate:
+        ticker = task.LoopingCall.withCount(tick)
+        ticker.clock = clock
+        ticker.start(1.0 / rate, now=True)
+    else:
+        for _ in range(concurrency or 1):
+            launch()
+
+    return finished
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: file_cache.py
+
+Memory bounded least-recently-used cache of file objects.
+
+Used by the `FileType` ORM class to load the content of a file passed to
+many endpoint calls in a session only once. Every session has its own
+cache, made available to `FileType` by the `file_cache` key in the data of
+the request graph.
+"""
+
+import os
+import logging
+
+from collections import OrderedDict
+
+lg = logging.getLogger('clilogger')
+
+# Default cache size limit in bytes
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class FileContentCache(object):
+    """
+    LRU cache of file objects keyed by absolute path, mtime and size
+
+    A cached file object is reused as long as the file modification time
+    and size did not change. The least recently used file objects are
+    evicted when the total file size exceeds `max_bytes`, files larger than
+    `max_bytes` are not cached.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param max_bytes: cache size limit in bytes
+        :type max_bytes:  :py:int
+        """
+
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+
+    def __len__(self):
+
+        return len(self._entries)
+
+    def clear(self, max_bytes=None):
+        """
+        Empty the cache
+
+        :param max_bytes: optionally set a new cache size limit in bytes
+        :type max_bytes:  :py:int
+        """
+
+        self._entries.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+
+    def _evict(self):
+
+        while self.size > self.max_bytes and self._entries:
+            _, (_, nbytes, _) = self._entries.popitem(last=False)
+            self.size -= nbytes
+
+    def get(self, path, loader):
+        """
+        Get the file object for a file, loading it on a cache miss
+
+        :param path:   file path
+        :type path:    :py:str
+        :param loader: function returning the file object for an absolute
+                       file path
+        :type loader:  :py:func
+
+        :return:       copy of the (cached) file object
+        :rtype:        :py:dict
+        """
+
+        abspath = os.path.abspath(path)
+        stat = os.stat(abspath)
+        key = (abspath, stat.st_mtime, stat.st_size)
+
+        entry = self._entries.pop(abspath, None)
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            self._entries[abspath] = entry
+            return dict(entry[2])
+
+        if entry is not None:
+            self.size -= entry[1]
+
+        self.misses += 1
+        file_obj = loader(abspath)
+
+        if stat.st_size <= self.max_bytes:
+            self._entries[abspath] = (key, stat.st_size, file_obj)
+            self.size += stat.st_size
+            self._evict()
+
+        return dict(file_obj)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: io_utils.py
+
+File system helpers shared by the CLI caches and exports.
+"""
+
+import os
+import tempfile
+
+# Environment variable overriding the default cache directory
+CACHE_DIR_ENV = 'MDSTUDIO_CLI_CACHE'
+
+
+def cache_dir():
+    """
+    Directory for persisted CLI caches
+
+    Defaults to ~/.cache/mdstudio_cli, override using the MDSTUDIO_CLI_CACHE
+    environment variable. The directory is not created here but by the
+    caches when saving, see `makedirs`.
+
+    :return: absolute path to cache directory
+    :rtype:  :py:str
+    """
+
+    path = os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.expanduser('~'), '.cache', 'mdstudio_cli')
+
+    return os.path.abspath(path)
+
+
+def makedirs(path):
+    """
+    Create a directory and its parents if they do not exist
+
+    :param path: directory path
+    :type path:  :py:str
+
+    :raises OSError: if the directory could not be created
+    """
+
+    try:
+        os.makedirs(path)
+    except OSError:
+        # Created concurrently
+        if not os.path.isdir(path):
+            raise
+
+
+def atomic_write(path, data, mode='w'):
+    """
+    Write data to file atomically
+
+    Data is written to a temporary file in the same directory that replaces
+    `path` once complete. Readers never see a partially written file.
+
+    :param path: file path to write
+    :type path:  :py:str
+    :param data: data to write
+    :type data:  :py:str or :py:bytes
+    :param mode: file open mode, 'w' for text or 'wb' for bytes
+    :type mode:  :py:str
+    """
+
+    dirname = os.path.dirname(os.path.abspath(path))
+    handle, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.{0}.'.format(os.path.basename(path)))
+    try:
+        with os.fdopen(handle, mode) as outf:
+            outf.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: loadtest.py
+
+Statistics and reporting for the `mdstudio-cli loadtest` mode.
+
+The load itself is generated by `deferred_calls.run_load`.
+"""
+
+import bisect
+import logging
+
+from collections import Counter
+
+from mdstudio_cli.call_policy import LatencyTracker
+
+lg = logging.getLogger('clilogger')
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+class LoadTestStats(object):
+    """
+    Collect call latencies and errors during a load test
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        :param buckets: latency histogram bucket upper bounds in seconds,
+                        sorted in ascending order ending with infinity
+        :type buckets:  :py:tuple
+        """
+
+        self.buckets = tuple(buckets)
+        self.histogram = [0] * len(self.buckets)
+        self.latency = LatencyTracker(window=None)
+        self.queue_wait = LatencyTracker(window=None)
+        self.errors = Counter()
+        self.dropped = 0
+
+        self.started = None
+        self.stopped = None
+
+    @property
+    def calls(self):
+        """
+        Number of finished calls, successful or not
+        """
+
+        return sum(self.histogram)
+
+    @property
+    def error_count(self):
+        """
+        Number of failed calls
+        """
+
+        return sum(self.errors.values())
+
+    @property
+    def elapsed(self):
+        """
+        Duration of the load test in seconds
+        """
+
+        if self.started is None or self.stopped is None:
+            return 0.0
+        return self.stopped - self.started
+
+    def start(self, timestamp):
+
+        self.started = timestamp
+
+    def stop(self, timestamp):
+
+        self.stopped = timestamp
+
+    def record(self, latency, error=None, queue_wait=None):
+        """
+        Record a finished call
+
+        :param latency:    call latency in seconds from the moment the call
+                           was handed to a session
+        :type latency:     :py:float
+        :param error:      exception if the call failed
+        :type error:       :py:Exception
+        :param queue_wait: seconds the call waited for the byte budget and
+                           a pool session before, None if it never got one
+        :type queue_wait:  :py:float
+        """
+
+        self.latency.record(latency)
+        if queue_wait is not None:
+            self.queue_wait.record(queue_wait)
+        self.histogram[bisect.bisect_left(self.buckets, latency)] += 1
+
+        if error is not None:
+            self.errors[getattr(error, 'error', None) or type(error).__name__] += 1
+
+    def summary(self):
+        """
+        Load test summary
+
+        :return:    throughput (calls/sec), error rate, p50/p95/p99
+                    latencies and p50/p95/p99 queue wait
+        :rtype:     :py:dict
+        """
+
+        calls = self.calls
+        return {u'calls': calls,
+                u'errors': self.error_count,
+                u'dropped': self.dropped,
+                u'duration': self.elapsed,
+                u'throughput': calls / self.elapsed if self.elapsed else 0.0,
+                u'error_rate': self.error_count / float(calls) if calls else 0.0,
+                u'p50': self.latency.percentile(50),
+                u'p95': self.latency.percentile(95),
+                u'p99': self.latency.percentile(99),
+                u'queue_p50': self.queue_wait.percentile(50),
+                u'queue_p95': self.queue_wait.percentile(95),
+                u'queue_p99': self.queue_wait.percentile(99)}
+
+    def report(self, uri):
+        """
+        Write print friendly load test report to stdout
+
+        :param uri: endpoint URI
+        :type uri:  :py:str
+        """
+
+        summary = self.summary()
+
+        lg.info('\nLoad test results for endpoint: {0}\n'.format(uri))
+        lg.info('Calls:       {0} in {1:.2f} sec. ({2} dropped)'.format(summary['calls'], summary['duration'],
+                                                                       summary['dropped']))
+        lg.info('Throughput:  {0:.2f} calls/sec.'.format(summary['throughput']))
+        lg.info('Error rate:  {0:.2%}'.format(summary['error_rate']))
+        for error, count in self.errors.most_common():
+            lg.info('  {0:<40}  {1}'.format(error, count))
+
+        if summary['calls']:
+            lg.info('Latency:     p50 {0:.4f}  p95 {1:.4f}  p99 {2:.4f} sec.'.format(
+                summary['p50'], summary['p95'], summary['p99']))
+        if len(self.queue_wait):
+            lg.info('Queue wait:  p50 {0:.4f}  p95 {1:.4f}  p99 {2:.4f} sec.'.format(
+                summary['queue_p50'], summary['queue_p95'], summary['queue_p99']))
+
+        if summary['calls']:
+            lg.info('\nLatency histogram:')
+            top = max(self.histogram)
+            for bound, count in zip(self.buckets, self.histogram):
+                lg.info('  <= {0:<8}  {1:>8}  {2}'.format(bound, count, '#' * int(round(40.0 * count / top))))
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: metrics.py
+
+Opt-in run metrics exported in OpenMetrics text format.
+
+Metrics are always recorded in the module level `METRICS` registry, they
+are only written to file when requested using the `--cli_metrics` command line
+option. The file is written atomically, making it suitable for the node
+exporter textfile collector.
+"""
+
+import bisect
+import logging
+
+from mdstudio_cli.io_utils import atomic_write
+
+lg = logging.getLogger('clilogger')
+
+# Upper bounds of the latency histogram buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, float('inf'))
+
+
+def _escape(value):
+
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+
+    if not labels:
+        return ''
+    return '{{{0}}}'.format(','.join('{0}="{1}"'.format(k, _escape(v)) for k, v in labels))
+
+
+def _format_value(value):
+
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """
+    Monotonically increasing counter, optionally by label values
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        """
+        :param name:          metric family name without '_total' suffix
+        :type name:           :py:str
+        :param documentation: metric help text
+        :type documentation:  :py:str
+        :param labels:        label names
+        :type labels:         :py:tuple
+        """
+
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def inc(self, value=1, **labels):
+        """
+        Increment the counter
+
+        :param value:   increment, non-negative
+        :type value:    :py:int or :py:float
+        :param labels:  label values by label name
+        """
+
+        key = tuple((name, labels[name]) for name in self.labels)
+        self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels):
+
+        return self._values.get(tuple((name, labels[name]) for name in self.labels), 0)
+
+    def samples(self):
+
+        for key in sorted(self._values):
+            yield '{0}_total{1} {2}'.format(self.name, _format_labels(key), _format_value(self._values[key]))
+
+
+class Histogram(object):
+    """
+    Distribution of observed values over cumulative buckets
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        """
+        :param name:          metric family name
+        :type name:           :py:str
+        :param documentation: metric help text
+        :type documentation:  :py:str
+        :param buckets:       bucket upper bounds in ascending order ending
+                              with infinity
+        :type buckets:        :py:tuple
+        """
+
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+
+    @property
+    def count(self):
+
+        return sum(self.counts)
+
+    def observe(self, value):
+        """
+        Observe a value
+
+        :param value: observed value
+        :type value:  :py:float
+        """
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield '{0}_bucket{{le="{1}"}} {2}'.format(self.name, _format_value(bound), cumulative)
+        yield '{0}_count {1}'.format(self.name, cumulative)
+        yield '{0}_sum {1}'.format(self.name, _format_value(self.sum))
+
+
+class MetricsRegistry(object):
+    """
+    Collection of metrics rendered together in OpenMetrics text format
+    """
+
+    def __init__(self):
+
+        self.metrics = []
+
+    def counter(self, name, documentation, labels=()):
+        """
+        Register a new counter
+
+        :rtype: :mdstudio_cli:metrics:Counter
+        """
+
+        metric = Counter(name, documentation, labels=labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        """
+        Register a new histogram
+
+        :rtype: :mdstudio_cli:metrics:Histogram
+        """
+
+        metric = Histogram(name, documentation, buckets=buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render all metrics in OpenMetrics text format
+
+        :rtype: :py:str
+        """
+
+        lines = []
+        for metric in self.metrics:
+            lines.append('# TYPE {0} {1}'.format(metric.name, metric.kind))
+            lines.append('# HELP {0} {1}'.format(metric.name, _escape(metric.documentation)))
+            lines.extend(metric.samples())
+        lines.append('# EOF')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Atomically write all metrics to file in OpenMetrics text format
+
+        Failure to write the file is logged and does not raise.
+
+        :param path: metrics file path
+        :type path:  :py:str
+        """
+
+        try:
+            atomic_write(path, self.render())
+        except (IOError, OSError) as error:
+            lg.warning('Unable to write metrics to {0}: {1}'.format(path, error))
+
+
+METRICS = MetricsRegistry()
+CALLS = METRICS.counter('mdstudio_cli_calls', 'Endpoint calls')
+CALL_ERRORS = METRICS.counter('mdstudio_cli_call_errors', 'Failed endpoint calls by error URI', labels=('error',))
+COALESCED_CALLS = METRICS.counter('mdstudio_cli_coalesced_calls',
+                                  'Endpoint calls attached to an identical call in flight')
+SCHEMA_FETCH_SECONDS = METRICS.histogram('mdstudio_cli_schema_fetch_seconds', 'Schema retrieval latency')
+CALL_SECONDS = METRICS.histogram('mdstudio_cli_call_seconds', 'Endpoint call latency')
+RESULT_PROCESSING_SECONDS = METRICS.histogram('mdstudio_cli_result_processing_seconds', 'Result processing time')
+UPLOADED_BYTES = METRICS.counter('mdstudio_cli_uploaded_bytes',
+                                 'Encoded file content bytes sent to endpoints, for every call attempt')
+DOWNLOADED_BYTES = METRICS.counter('mdstudio_cli_downloaded_bytes',
+                                   'Encoded file content bytes stored from endpoint results')
+
+
+def record_call(latency, error=None):
+    """
+    Record a finished endpoint call
+
+    :param latency: call latency in seconds
+    :type latency:  :py:float
+    :param error:   exception if the call failed
+    :type error:    :py:Exception
+    """
+
+    CALLS.inc()
+    CALL_SECONDS.observe(latency)
+
+    if error is not None:
+        CALL_ERRORS.inc(error=getattr(error, 'error', None) or type(error).__name__)
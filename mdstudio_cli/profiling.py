@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: profiling.py
+
+CPU and memory profiling of a CLI run enabled by the `--cli_profile` option.
+
+The CPU profile is recorded using the deterministic cProfile profiler and
+written as pstats file. The memory profile is a tracemalloc snapshot taken
+at the end of the run. In both cases a short summary of the top functions
+or allocation sites is written to standard error (stderr), leaving the
+endpoint output on standard out untouched.
+"""
+
+import cProfile
+import logging
+import os
+import pstats
+import sys
+
+from contextlib import contextmanager
+
+lg = logging.getLogger('clilogger')
+
+# Number of functions or allocation sites in the summary
+SUMMARY_TOP = 20
+
+
+class CPUProfiler(object):
+    """
+    Deterministic CPU profile of all function calls
+    """
+
+    extension = 'pstats'
+
+    def __init__(self):
+
+        self.profile = cProfile.Profile()
+
+    def start(self):
+
+        self.profile.enable()
+
+    def stop(self):
+
+        self.profile.disable()
+
+    def write(self, path):
+        """
+        Write the profile as pstats file
+
+        Inspect using `python -m pstats <path>` or a pstats viewer.
+
+        :param path: pstats file path
+        :type path:  :py:str
+        """
+
+        self.profile.dump_stats(path)
+
+    def summary(self, top=SUMMARY_TOP, stream=None):
+        """
+        Write the functions with the highest internal time
+
+        :param top:    number of functions to report
+        :type top:     :py:int
+        :param stream: output stream, defaults to stderr
+        """
+
+        stats = pstats.Stats(self.profile, stream=stream or sys.stderr)
+        stats.strip_dirs().sort_stats('tottime').print_stats(top)
+
+
+class MemoryProfiler(object):
+    """
+    tracemalloc snapshot of memory allocated during the run
+
+    Requires Python 3.4 or newer.
+    """
+
+    extension = 'tracemalloc'
+
+    def __init__(self, frames=25):
+        """
+        :param frames: number of frames stored per allocation traceback
+        :type frames:  :py:int
+        """
+
+        try:
+            import tracemalloc
+        except ImportError:
+            raise ImportError('Memory profiling requires Python 3.4 or newer')
+
+        self.tracemalloc = tracemalloc
+        self.frames = frames
+        self.snapshot = None
+        self.peak = 0
+
+    def start(self):
+
+        self.tracemalloc.start(self.frames)
+
+    def stop(self):
+
+        self.peak = self.tracemalloc.get_traced_memory()[1]
+        self.snapshot = self.tracemalloc.take_snapshot().filter_traces((
+            self.tracemalloc.Filter(False, self.tracemalloc.__file__),
+            self.tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')))
+        self.tracemalloc.stop()
+
+    def write(self, path):
+        """
+        Write the snapshot to file
+
+        Load for further analysis using `tracemalloc.Snapshot.load(<path>)`.
+
+        :param path: snapshot file path
+        :type path:  :py:str
+        """
+
+        self.snapshot.dump(path)
+
+    def summary(self, top=SUMMARY_TOP, stream=None):
+        """
+        Write the source lines holding most memory at the end of the run
+
+        :param top:    number of allocation sites to report
+        :type top:     :py:int
+        :param stream: output stream, defaults to stderr
+        """
+
+        stream = stream or sys.stderr
+        statistics = self.snapshot.statistics('lineno')
+
+        stream.write('Peak traced memory: {0:.1f} KiB\n'.format(self.peak / 1024.0))
+        stream.write('Memory in use: {0:.1f} KiB in {1} allocation sites\n'.format(
+            sum(stat.size for stat in statistics) / 1024.0, len(statistics)))
+        for index, stat in enumerate(statistics[:top], start=1):
+            frame = stat.traceback[0]
+            stream.write('{0:3d} {1}:{2}: {3:.1f} KiB in {4} blocks\n'.format(
+                index, frame.filename, frame.lineno, stat.size / 1024.0, stat.count))
+
+
+PROFILERS = {u'cpu': CPUProfiler, u'mem': MemoryProfiler}
+
+
+@contextmanager
+def profiled(kind, path=None, top=SUMMARY_TOP, stream=None):
+    """
+    Profile the code run in the context
+
+    The profile is written and summarized when the context exits, also when
+    it exits by an exception such as SystemExit.
+
+    :param kind:   'cpu' or 'mem'
+    :type kind:    :py:str
+    :param path:   profile output file, defaults to mdstudio_cli.<extension>
+                   in the current working directory
+    :type path:    :py:str
+    :param top:    number of functions or allocation sites to summarize
+    :type top:     :py:int
+    :param stream: summary output stream, defaults to stderr
+    """
+
+    stream = stream or sys.stderr
+    profiler = PROFILERS[kind]()
+    path = path or os.path.join(os.getcwd(), 'mdstudio_cli.{0}'.format(profiler.extension))
+
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        try:
+            profiler.write(path)
+        except (IOError, OSError) as error:
+            lg.warning('Unable to write {0} profile to {1}: {2}'.format(kind, path, error))
+        else:
+            stream.write('{0} profile written to {1}\n'.format(kind, path))
+
+        profiler.summary(top=top, stream=stream)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: schema_cache.py
+
+Persistent cache of compiled endpoint request schema graphs.
+
+Building the ORM enabled graph from a JSON Schema dictionary is costly for
+large schemas. Compiled graphs are pickled to the CLI cache directory keyed
+by endpoint URI and schema content hash so later runs load the graph
+directly. Within a session the pickled graph is kept in memory and every
+request unpickles a new, independent graph.
+"""
+
+import copy
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import sys
+
+from mdstudio_cli.io_utils import cache_dir, atomic_write, makedirs
+
+# Graphs pickled by another graphit version may not load, the cache itself
+# does not require graphit
+try:
+    from graphit import __version__ as GRAPHIT_VERSION
+except ImportError:
+    GRAPHIT_VERSION = None
+
+lg = logging.getLogger('clilogger')
+
+# Increment when the pickled graph layout changes to invalidate old files
+CACHE_FORMAT = 1
+
+
+def schema_digest(schema):
+    """
+    Content hash of a JSON Schema dictionary
+
+    Includes the cache format, Python major version and graphit version the
+    graph is pickled with.
+
+    :param schema: JSON Schema
+    :type schema:  :py:dict
+
+    :return:       SHA1 hex digest
+    :rtype:        :py:str
+    """
+
+    content = json.dumps(schema, sort_keys=True, separators=(',', ':'))
+    tag = u'{0}:{1}:{2}:{3}'.format(CACHE_FORMAT, sys.version_info[0], GRAPHIT_VERSION, content)
+
+    return hashlib.sha1(tag.encode('utf-8')).hexdigest()
+
+
+class SchemaGraphCache(object):
+    """
+    Cache of compiled request schema graphs by endpoint URI
+
+    The graph ORM is detached before pickling and reattached to every graph
+    returned. Cache files that fail to load are removed and rebuilt, graphs
+    that cannot be pickled are compiled for every request.
+    """
+
+    def __init__(self, orm=None, path=None):
+        """
+        :param orm:  graph ORM to attach to returned graphs
+        :type orm:   :graphit:graph_orm:GraphORM
+        :param path: cache directory, defaults to 'schemas' in the CLI cache
+                     directory
+        :type path:  :py:str
+        """
+
+        self.orm = orm
+        self.path = path
+        self._graphs = {}
+
+    def _cache_file(self, uri, digest):
+
+        if self.path is None:
+            self.path = os.path.join(cache_dir(), 'schemas')
+
+        return os.path.join(self.path, re.sub(r'[^\w.-]', '_', uri), u'{0}.pickle'.format(digest))
+
+    def _load(self, cache_file):
+        """
+        Load a pickled graph from a cache file
+
+        :param cache_file: cache file path
+        :type cache_file:  :py:str
+
+        :return:           pickled data and the graph unpickled from it or
+                           None if there is no valid cache file
+        :rtype:            :py:tuple
+        """
+
+        try:
+            with open(cache_file, 'rb') as inf:
+                data = inf.read()
+            graph = pickle.loads(data)
+        except (IOError, OSError):
+            return None
+        except Exception as error:
+            lg.warning('Rebuilding corrupt schema graph cache {0}: {1}'.format(cache_file, error))
+            try:
+                os.remove(cache_file)
+            except OSError:
+                pass
+            return None
+
+        return data, graph
+
+    def _dump(self, uri, graph, cache_file):
+
+        orm = getattr(graph, 'orm', None)
+        graph.orm = None
+        try:
+            data = pickle.dumps(graph, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as error:
+            lg.debug('Unable to pickle schema graph for {0}: {1}'.format(uri, error))
+            return None
+        finally:
+            graph.orm = orm
+
+        # Keep only the graph for the current schema version
+        try:
+            uri_dir = os.path.dirname(cache_file)
+            if os.path.isdir(uri_dir):
+                for stale in glob.glob(os.path.join(uri_dir, '*.pickle')):
+                    os.remove(stale)
+            else:
+                makedirs(uri_dir)
+            atomic_write(cache_file, data, mode='wb')
+        except (IOError, OSError) as error:
+            lg.warning('Unable to save schema graph cache {0}: {1}'.format(cache_file, error))
+
+        return data
+
+    def get(self, uri, schema, compiler):
+        """
+        Get a new ORM enabled graph for an endpoint request schema
+
+        :param uri:      endpoint URI
+        :type uri:       :py:str
+        :param schema:   endpoint request JSON Schema
+        :type schema:    :py:dict
+        :param compiler: function building the graph from a JSON Schema
+                         dictionary
+        :type compiler:  :py:func
+
+        :return:         request schema graph
+        """
+
+        graph = None
+        entry = self._graphs.get(uri)
+        if entry is None or entry[0] is not schema:
+            cache_file = self._cache_file(uri, schema_digest(schema))
+            loaded = self._load(cache_file)
+            if loaded is None:
+                graph = compiler(copy.deepcopy(schema))
+                data = self._dump(uri, graph, cache_file)
+            else:
+                data, graph = loaded
+
+            entry = self._graphs[uri] = (schema, data)
+
+        if graph is None:
+            graph = compiler(copy.deepcopy(schema)) if entry[1] is None else pickle.loads(entry[1])
+
+        graph.orm = self.orm
+        return graph
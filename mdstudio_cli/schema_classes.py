@@ -16,6 +16,23 @@ from graphit.graph_orm import GraphORM
 lg = logging.getLogger('clilogger')
 
 
+def read_file(abspath):
+    """
+    Read a file into a file object
+
+    :param abspath: absolute file path
+    :type abspath:  :py:str
+
+    :return:        file path, extension and content
+    :rtype:         :py:dict
+    """
+
+    with open(abspath, 'r') as inf:
+        content = inf.read()
+
+    return {u'path': abspath, u'extension': os.path.splitext(abspath)[-1].lstrip('.'), u'content': content}
+
+
 class IntegerType(NodeAxisTools):
 
     def set(self, key, value=None):
@@ -61,10 +78,13 @@ class FileType(NodeAxisTools):
             if not os.path.isfile(abspath):
                 raise IOError('Argument {0} file does not exist: {1}'.format(self.key, value))
 
-            file_obj[u'path'] = abspath
-            file_obj[u'extension'] = os.path.splitext(abspath)[-1].lstrip('.')
-            with open(abspath, 'r') as inf:
-                file_obj[u'content'] = inf.read()
+            # Reuse content of files already loaded in the session, the session
+            # file cache is stored in the request graph data
+            file_cache = self.data.get('file_cache')
+            if file_cache is not None:
+                file_obj.update(file_cache.get(abspath, read_file))
+            else:
+                file_obj.update(read_file(abspath))
 
         if set(children.keys()) == {u'content', u'path', u'extension', u'encoding'}:
             children[u'path'].set(self.data.value_tag, file_obj[u'path'])
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: session_pool.py
+
+Distribute calls over a pool of MDStudio WAMP sessions.
+
+Calls are assigned to the session with the least outstanding requests.
+Every session accepts a limited number of outstanding requests (flow
+control), additional requests wait in first-in first-out order until a
+session becomes available.
+"""
+
+from collections import deque
+
+
+class SessionPool(object):
+    """
+    Least-outstanding-requests scheduler for a pool of WAMP sessions
+
+    The pool is event loop agnostic: work is submitted as a callback that
+    is called with the selected session. The callback owner releases the
+    session once the request finished. The Twisted implementation issuing
+    the WAMP calls is `deferred_calls.pool_call`.
+    """
+
+    def __init__(self, max_outstanding=8):
+        """
+        :param max_outstanding: maximum number of outstanding requests per
+                                session. None for no limit.
+        :type max_outstanding:  :py:int
+        """
+
+        self.max_outstanding = max_outstanding
+        self.closed = False
+
+        self._members = []
+        self._outstanding = {}
+        self._waiting = deque()
+
+    def __len__(self):
+
+        return len(self._members)
+
+    def __contains__(self, session):
+
+        return id(session) in self._outstanding
+
+    @property
+    def sessions(self):
+        """
+        Sessions in the pool
+        """
+
+        return list(self._members)
+
+    @property
+    def waiting(self):
+        """
+        Number of requests waiting for a session
+        """
+
+        return len(self._waiting)
+
+    def outstanding(self, session=None):
+        """
+        Number of outstanding requests
+
+        :param session: session to report for, all sessions by default
+
+        :rtype:         :py:int
+        """
+
+        if session is None:
+            return sum(self._outstanding.values())
+        return self._outstanding.get(id(session), 0)
+
+    def add(self, session):
+        """
+        Add a session to the pool and hand it waiting requests
+
+        :param session: WAMP session
+
+        :return:        False if the pool is closed, the session should
+                        then disconnect
+        :rtype:         :py:bool
+        """
+
+        if self.closed:
+            return False
+
+        if session not in self:
+            self._members.append(session)
+            self._outstanding[id(session)] = 0
+            self._dispatch()
+
+        return True
+
+    def remove(self, session):
+        """
+        Remove a session from the pool
+
+        Outstanding requests of the session are not affected, it will not
+        receive new ones.
+
+        :param session: WAMP session
+        """
+
+        if session in self:
+            self._members.remove(session)
+            del self._outstanding[id(session)]
+
+    def close(self):
+        """
+        Close the pool
+
+        Removes all sessions, sessions joining later are refused and new
+        requests fail. Requests waiting for a session are called with None.
+
+        :return: sessions removed from the pool
+        :rtype:  :py:list
+        """
+
+        self.closed = True
+
+        sessions = self.sessions
+        del self._members[:]
+        self._outstanding.clear()
+
+        while self._waiting:
+            self._waiting.popleft()(None)
+
+        return sessions
+
+    def _select(self):
+        """
+        Select the session with the least outstanding requests
+
+        :return: session or None if all sessions are at their limit
+        """
+
+        selected = None
+        for session in self._members:
+            count = self._outstanding[id(session)]
+            if self.max_outstanding is not None and count >= self.max_outstanding:
+                continue
+            if selected is None or count < self._outstanding[id(selected)]:
+                selected = session
+
+        return selected
+
+    def _dispatch(self):
+
+        while self._waiting:
+            session = self._select()
+            if session is None:
+                break
+
+            callback = self._waiting.popleft()
+            self._outstanding[id(session)] += 1
+            callback(session)
+
+    def acquire(self, callback):
+        """
+        Submit a request to the pool
+
+        `callback` is called with the selected session directly if a session
+        is available, else once one becomes available. It is called with None
+        if the pool is closed before that.
+
+        :param callback: function accepting the session as argument
+        :type callback:  :py:func
+
+        :raises IOError: if the pool is closed
+        """
+
+        if self.closed:
+            raise IOError('Session pool closed')
+
+        self._waiting.append(callback)
+        self._dispatch()
+
+    def discard(self, callback):
+        """
+        Withdraw a request still waiting for a session
+
+        :param callback: callback submitted using `acquire`
+        :type callback:  :py:func
+
+        :return:         True if the request was still waiting
+        :rtype:          :py:bool
+        """
+
+        try:
+            self._waiting.remove(callback)
+        except ValueError:
+            return False
+
+        return True
+
+    def release(self, session):
+        """
+        Signal that a request issued on `session` finished
+
+        :param session: WAMP session handed to the request callback
+        """
+
+        if session in self:
+            self._outstanding[id(session)] = max(0, self._outstanding[id(session)] - 1)
+        self._dispatch()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""
+file: session_setup.py
+
+Prepare CLI sessions for calling endpoints.
+
+The Twisted session in `wamp_services.py` and the asyncio client in
+`asyncio_client.py` build the same call policies, caches and in-flight
+byte budget from the CLI configuration. Both use `setup_session` so the
+configuration is interpreted in one place.
+"""
+
+from mdstudio_cli.byte_budget import ByteBudget
+from mdstudio_cli.call_policy import CallTimeout, LatencyTracker, call_policies
+from mdstudio_cli.catalog import EndpointCatalog
+from mdstudio_cli.cli_parser import SESSION_DEFAULTS
+from mdstudio_cli.file_cache import FileContentCache
+from mdstudio_cli.schema_cache import SchemaGraphCache
+from mdstudio_cli.schema_classes import CLIORM
+
+MB = 1024 * 1024
+
+# Python client configuration defaults, the command line defaults plus the
+# client only options
+CLIENT_DEFAULTS = dict(SESSION_DEFAULTS, spill_threshold=None, coalesce=False)
+
+
+def setup_session(session, config, retry_exceptions=(CallTimeout,)):
+    """
+    Prepare a session for calling endpoints
+
+    Sets the endpoint call policy, latency tracker, schema graph cache,
+    endpoint catalog, input file cache, in-flight byte budget, result spill
+    threshold and call coalescing on the session. All are kept for the
+    lifetime of the session so they can be reused by consecutive calls.
+
+    :param session:          Twisted session or asyncio client
+    :param config:           CLI configuration
+    :type config:            :py:dict
+    :param retry_exceptions: exceptions on which calls are retried
+    :type retry_exceptions:  :py:tuple
+
+    :return:                 call policy for schema retrieval
+    :rtype:                  :mdstudio_cli:call_policy:CallPolicy
+    """
+
+    session.call_policy, schema_policy = call_policies(config, retry_exceptions=retry_exceptions)
+    session.latency = LatencyTracker()
+
+    session.schema_graphs = SchemaGraphCache(orm=CLIORM)
+    session.catalog = EndpointCatalog()
+    session._request_schemas = {}
+    session._schema_requests = {}
+    session.file_cache = FileContentCache(max_bytes=int(config.get('file_cache', SESSION_DEFAULTS['file_cache']) * MB))
+
+    # Limit payload bytes in flight, result content waiting in `map` may be spilled
+    max_inflight, spill_threshold = config.get('max_inflight'), config.get('spill_threshold')
+    session.budget = ByteBudget(max_bytes=int(max_inflight * MB) if max_inflight else None)
+    session.spill_threshold = int(spill_threshold * MB) if spill_threshold is not None else None
+
+    # Identical calls in flight by request key
+    session.coalesce = bool(config.get('coalesce'))
+    session._inflight = {}
+
+    return schema_policy
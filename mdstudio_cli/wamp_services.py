@@ -9,25 +9,66 @@ WAMP service methods the module exposes.
 import os
 import json
 import logging
+import time
 
-from twisted.internet import reactor
-from autobahn.wamp.exception import ApplicationError
+from twisted.internet import defer, reactor, task
+from twisted.python.failure import Failure
+from autobahn.twisted.wamp import ApplicationRunner
+from autobahn.wamp.exception import ApplicationError, TransportLost
 from graphit.graph_io.io_jsonschema_format import read_json_schema
 
 from mdstudio.component.session import ComponentSession
 from mdstudio.deferred.chainable import chainable
+from mdstudio.deferred.return_value import return_value
 
-from mdstudio_cli.schema_parser import SchemaParser, write_schema_info, prepaire_config, process_results
-from mdstudio_cli.schema_classes import CLIORM
+from mdstudio_cli.byte_budget import file_content_size, input_size, payload_size
+from mdstudio_cli.call_policy import CallTimeout
+from mdstudio_cli.coalescing import request_key
+from mdstudio_cli.deferred_calls import budget_call, coalesced_call, policy_call, pool_call, run_load
+from mdstudio_cli.schema_parser import SchemaParser
+from mdstudio_cli.schema_utils import write_schema_info, prepaire_config, process_results, update_catalog
+from mdstudio_cli.loadtest import LoadTestStats
+from mdstudio_cli.metrics import METRICS, COALESCED_CALLS, UPLOADED_BYTES, record_call
+from mdstudio_cli.session_pool import SessionPool
+from mdstudio_cli.session_setup import setup_session
 
 lg = logging.getLogger('clilogger')
 
 
+class PoolMemberSession(ComponentSession):
+    """
+    Additional WAMP session in the CLI session pool.
+
+    Adds itself to the session pool passed in the component config `extra`
+    once it is ready and removes itself when leaving. Leaves right away if
+    the pool was closed while connecting.
+    """
+
+    def authorize_request(self, uri, claims):
+
+        return True
+
+    def on_run(self):
+
+        if not self.config.extra['pool'].add(self):
+            self.leave()
+
+    def onLeave(self, details):
+
+        self.config.extra['pool'].remove(self)
+        return super(PoolMemberSession, self).onLeave(details)
+
+
 class CliWampApi(ComponentSession):
     """
     CLI WAMP methods.
     """
 
+    pool = None
+    pool_connecting = ()
+    schema_parser = None
+    metrics_writer = None
+
     def authorize_request(self, uri, claims):
         """
         If you were allowed to call this in the first place,
@@ -36,6 +77,119 @@ class CliWampApi(ComponentSession):
 
         return True
 
+    def open_pool(self):
+        """
+        Open the pool of sessions endpoint calls are distributed over
+
+        The pool always contains the current session. Additional sessions
+        are opened for the router URL's listed in the `cli_pool` section of
+        the static settings (settings.yml):
+
+            cli_pool:
+              routers: [ws://localhost:8080/ws]
+              sessions: 2
+              max_outstanding: 8
+
+        `sessions` sets the number of sessions opened per router and
+        `max_outstanding` the number of outstanding calls per session.
+
+        The pool is opened once, by the first endpoint call.
+
+        :return:    session pool
+        :rtype:     :mdstudio_cli:session_pool:SessionPool
+        """
+
+        if self.pool is not None:
+            return self.pool
+
+        settings = self.component_config.static.get('cli_pool') or {}
+
+        self.pool = SessionPool(max_outstanding=settings.get('max_outstanding', 8))
+        self.pool.add(self)
+
+        def connect_failed(failure, url):
+            if not failure.check(defer.CancelledError):
+                lg.error('Unable to open pool session to router {0}: {1}'.format(url, failure.getErrorMessage()))
+
+        self.pool_connecting = []
+        for url in settings.get('routers') or []:
+            for _ in range(settings.get('sessions', 1)):
+                runner = ApplicationRunner(url, self.config.realm, extra={'pool': self.pool})
+                connecting = runner.run(PoolMemberSession, start_reactor=False, auto_reconnect=False)
+                connecting.addErrback(connect_failed, url)
+                self.pool_connecting.append(connecting)
+
+        return self.pool
+
+    def pool_capacity(self):
+        """
+        Number of calls the configured session pool accepts concurrently
+
+        :return:    outstanding call limit of all pool sessions, None for no
+                    limit
+        :rtype:     :py:int
+        """
+
+        settings = self.component_config.static.get('cli_pool') or {}
+
+        max_outstanding = settings.get('max_outstanding', 8)
+        if max_outstanding is None:
+            return None
+
+        sessions = 1 + len(settings.get('routers') or []) * settings.get('sessions', 1)
+        return sessions * max_outstanding
+
+    def close_pool(self):
+        """
+        Disconnect the additional sessions in the session pool
+
+        Connection attempts still in progress are cancelled, sessions that
+        are connected but did not join yet leave once they join.
+        """
+
+        for connecting in self.pool_connecting:
+            if not connecting.called:
+                connecting.cancel()
+        self.pool_connecting = ()
+
+        if self.pool is not None:
+            for session in self.pool.close():
+                if session is not self:
+                    session.disconnect()
+
+    def set_run_status(self, succeeded):
+        """
+        Report the outcome of the command to `cli_entry_point.run_backend`
+
+        The first status set is kept.
+
+        :param succeeded:   the command succeeded
+        :type succeeded:    :py:bool
+        """
+
+        status = self.config.extra.get('run_status')
+        if status is not None:
+            status.setdefault('succeeded', succeeded)
+
+    def close_session(self):
+        """
+        Disconnect from broker and stop reactor event loop
+
+        Writes the run metrics if requested. The command succeeded unless
+        `error_callback` reported a failure before.
+        """
+
+        self.set_run_status(True)
+
+        if self.metrics_writer is not None and self.metrics_writer.running:
+            self.metrics_writer.stop()
+        if self.config.extra.get('metrics'):
+            METRICS.write(self.config.extra['metrics'])
+
+        self.close_pool()
+        self.disconnect()
+        reactor.stop()
+
     def result_callback(self, result):
         """
         WAMP result callback
@@ -55,10 +209,6 @@ class CliWampApi(ComponentSession):
         # Process file-like output and print remaining.
         process_results(result)
 
-        # Disconnect from broker and stop reactor event loop
-        self.disconnect()
-        reactor.stop()
-
     def error_callback(self, failure):
         """
         WAMP error callback
@@ -75,38 +225,255 @@ class CliWampApi(ComponentSession):
         elif isinstance(failure.value, ApplicationError):
             failure_message = failure.value.error_message()
         else:
-            failure.getErrorMessage()
+            failure_message = failure.getErrorMessage()
 
         lg.error('Unable to process: {0}'.format(failure_message))
+        self.set_run_status(False)
 
         # Disconnect from broker and stop reactor event loop
-        self.disconnect()
-        reactor.stop()
+        self.close_session()
+
+    def setup(self, config):
+        """
+        Prepare the session for calling endpoints
+
+        Builds the call policies, caches and in-flight byte budget shared
+        with the asyncio backend and the schema parser. The session pool is
+        opened by the first endpoint call.
+
+        :param config:  CLI configuration
+        :type config:   :py:dict
+        """
+
+        schema_policy = setup_session(self, config, retry_exceptions=(CallTimeout, TransportLost))
+        self.schema_parser = SchemaParser(self, policy=schema_policy)
+
+        # Periodically write run metrics
+        self.metrics_writer = None
+        if config.get('metrics') and config.get('metrics_interval'):
+            self.metrics_writer = task.LoopingCall(METRICS.write, config['metrics'])
+            self.metrics_writer.start(config['metrics_interval'], now=False)
+
+    @chainable
+    def request_schema(self, uri):
+        """
+        Get the ORM enabled request JSON Schema graph for an endpoint
+
+        Schemas are cached by endpoint URI and compiled graphs are persisted
+        in the schema graph cache. Concurrent requests for a schema not yet
+        cached share a single retrieval. Every call returns a new graph so
+        endpoint input can be set without affecting other calls.
+
+        :param uri: endpoint URI
+        :type uri:  :py:str
+
+        :return:    request schema graph as Twisted deferred object
+        """
+
+        if uri not in self._request_schemas:
+            yield coalesced_call(self._schema_requests, uri, lambda: self._fetch_request_schema(uri))
+
+        request = self.schema_graphs.get(uri, self._request_schemas[uri], read_json_schema)
+        request.data['file_cache'] = self.file_cache
+
+        return_value(request)
+
+    @chainable
+    def _fetch_request_schema(self, uri):
+        """
+        Retrieve, compile and register an endpoint request schema
+
+        :param uri: endpoint URI
+        :type uri:  :py:str
+        """
+
+        schema = yield self.schema_parser.get(uri=uri, request=True, clean_cache=False)
+        self._request_schemas[uri] = schema
+
+        # Register endpoint in the local endpoint catalog
+        update_catalog(self.catalog, uri, self.schema_graphs.get(uri, schema, read_json_schema))
+
+    @chainable
+    def bind_input(self, uri, package_config):
+        """
+        Bind endpoint arguments to the endpoint request schema
+
+        :param uri:            endpoint URI
+        :type uri:             :py:str
+        :param package_config: endpoint arguments by (dot separated) argument
+                               path as accepted on the command line
+        :type package_config:  :py:dict
+
+        :return:               endpoint input as Twisted deferred object
+        """
+
+        request = yield self.request_schema(uri)
+        return_value(prepaire_config(request, package_config))
+
+    def call_bound(self, uri, endpoint_input, dispatched=None):
+        """
+        Call an endpoint with input bound by `bind_input`
+
+        The call is issued on the least busy pool session according to the
+        session call policy. File content is counted as uploaded for every
+        attempt handed to a session.
+
+        :param uri:            endpoint URI
+        :type uri:             :py:str
+        :param endpoint_input: endpoint input
+        :type endpoint_input:  :py:dict
+        :param dispatched:     function called when the call is handed to
+                               a pool session
+        :type dispatched:      :py:func
+
+        :return:               endpoint results as Twisted deferred object
+        """
+
+        start = time.time()
+        uploaded = file_content_size(endpoint_input)
+
+        def record(result):
+            error = result.value if isinstance(result, Failure) else None
+            record_call(time.time() - start, error=error)
+            return result
+
+        def sent():
+            UPLOADED_BYTES.inc(uploaded)
+            if dispatched is not None:
+                dispatched()
+
+        pool = self.open_pool()
+        deferred = policy_call(lambda: pool_call(pool, uri, endpoint_input, dispatched=sent), uri,
+                               self.call_policy, tracker=self.latency)
+        deferred.addBoth(record)
+
+        return deferred
+
+    def call_endpoint(self, uri, package_config, process=None):
+        """
+        Call an endpoint with input bound to its request schema
+
+        The input is bound once the estimated payload size fits the in-flight
+        byte budget. The result size is charged to the budget until the
+        result was processed by `process` and returned. With coalescing
+        enabled, the call attaches to an identical call in flight if any and
+        returns its payload reservation as it sends nothing.
+
+        :param uri:            endpoint URI
+        :type uri:             :py:str
+        :param package_config: endpoint arguments by (dot separated) argument
+                               path as accepted on the command line
+        :type package_config:  :py:dict
+        :param process:        function called with the endpoint results,
+                               its return value is the call result
+        :type process:         :py:func
+
+        :return:               endpoint results as Twisted deferred object
+        """
+
+        @chainable
+        def bind_and_call(reservation):
+            endpoint_input = yield self.bind_input(uri, package_config)
+
+            if self.coalesce:
+                key = request_key(uri, endpoint_input)
+                if key in self._inflight:
+                    COALESCED_CALLS.inc()
+                    reservation.release()
+                result = yield coalesced_call(self._inflight, key, lambda: self.call_bound(uri, endpoint_input))
+            else:
+                result = yield self.call_bound(uri, endpoint_input)
+
+            reservation.charge(payload_size(result))
+            if process is not None:
+                result = process(result)
+
+            return_value(result)
+
+        return budget_call(self.budget, input_size(package_config), bind_and_call)
+
+    @chainable
+    def run_loadtest(self, config):
+        """
+        Load test an endpoint and report throughput, errors and latencies
+
+        The endpoint input is bound once from the command line arguments and
+        used as template for all calls. Calls are never coalesced.
+
+        Latency is timed from the moment a call is handed to a pool session,
+        the time waiting for the in-flight byte budget and a session is
+        reported separately as queue wait.
+
+        :param config:  CLI configuration
+        :type config:   :py:dict
+        """
+
+        endpoint_input = yield self.bind_input(config['uri'], config['package_config'])
+
+        nbytes = payload_size(endpoint_input)
+
+        def call(dispatched):
+            return budget_call(self.budget, nbytes,
+                               lambda reservation: self.call_bound(config['uri'], endpoint_input,
+                                                                   dispatched=dispatched))
+
+        capacity = self.pool_capacity()
+        if config.get('concurrency') and capacity is not None and config['concurrency'] > capacity:
+            lg.warning('Concurrency of {0} calls exceeds the {1} outstanding calls the session pool accepts, calls '
+                       'will queue for a session. Add sessions or raise max_outstanding in the cli_pool '
+                       'settings.'.format(config['concurrency'], capacity))
+
+        lg.info('Load test {0} for {1} sec.'.format(config['uri'], config['duration']))
+        stats = yield run_load(call, LoadTestStats(), config['duration'], rate=config.get('rate'),
+                               concurrency=config.get('concurrency'))
+        stats.report(config['uri'])
+
+    def onLeave(self, details):
+
+        # Join rejected or session closed, fail a pending MDStudioClient connect
+        if self.config.extra.get('client') is not None:
+            self.config.extra['client'].session_lost(self, IOError('Session left realm {0}: {1} {2}'.format(
+                                                     self.config.realm, details.reason, details.message or '')))
+        return super(CliWampApi, self).onLeave(details)
+
+    def onDisconnect(self):
+
+        if self.config.extra.get('client') is not None:
+            self.config.extra['client'].session_lost(self, IOError('Disconnected from router'))
+        return super(CliWampApi, self).onDisconnect()
 
     @chainable
     def on_run(self):
 
         # Get endpoint config
         config = self.config.extra
+        self.setup(config)
 
-        # Retrieve JSON schemas for the endpoint request and response
-        schemaparser = SchemaParser(self)
-        request = yield schemaparser.get(uri=config['uri'], request=True)
-        request = read_json_schema(request)
-        request.orm = CLIORM
+        # Session embedded in a MDStudioClient, hand over control
+        if config.get('client') is not None:
+            config['client'].session_ready(self)
+            return
+
+        # Load test the endpoint
+        if config.get('mode') == 'loadtest':
+            deferred = self.run_loadtest(config)
+            deferred.addCallback(lambda _: self.close_session())
+            deferred.addErrback(self.error_callback)
 
         # Write print friendly endpoint definition to stdout or call endpoint
-        if config['get_endpoint_info']:
+        elif config['get_endpoint_info']:
+            try:
+                request = yield self.request_schema(config['uri'])
+            except Exception as error:
+                self.error_callback(error)
+                return
+
             write_schema_info(request, config['uri'])
 
             # Disconnect from broker and stop reactor event loop
-            self.disconnect()
-            reactor.stop()
+            self.close_session()
 
         else:
-            endpoint_input = prepaire_config(request, config['package_config'])
-
-            # Call method and wait for results
-            deferred = self.call(config['uri'], endpoint_input)
-            deferred.addCallback(self.result_callback)
+            deferred = self.call_endpoint(config['uri'], config['package_config'], process=self.result_callback)
+            deferred.addCallback(lambda _: self.close_session())
             deferred.addErrback(self.error_callback)
@@ -45,7 +45,8 @@ setup(
     dependency_links=["https://github.com/cinfony/cinfony/tarball/master#egg=cinfony-1.2"],
     include_package_data=True,
     zip_safe=True,
-    entry_points={'console_scripts': ['mdstudio-cli = mdstudio_cli.cli_entry_point:cli_main']},
+    entry_points={'console_scripts': ['mdstudio-cli = mdstudio_cli.cli_entry_point:cli_main',
+                                      'mdstudio-cli-complete = mdstudio_cli.catalog:complete_main']},
     classifiers=[
         'Development Status :: 3 - Alpha',
         'License :: OSI Approved :: Apache Software License',
@@ -7,6 +7,7 @@ Python runner for MDStudio_cli module unit tests, run as:
 """
 
 import os
+import subprocess
 import sys
 import unittest
 import logging
@@ -19,7 +20,7 @@ modulepath = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
 sys.path.insert(0, modulepath)
 
 
-def module_test_suite():
+def module_test_suite(pattern='module_*.py'):
     """
     Run MDStudio_cli module unit tests.
     """
@@ -27,12 +28,30 @@ def module_test_suite():
 
     print('Running MDStudio_cli unittests')
     testpath = os.path.join(os.path.dirname(__file__), 'module')
-    suite = loader.discover(testpath, pattern='module_*.py')
+    suite = loader.discover(testpath, pattern=pattern)
     runner = unittest.TextTestRunner(verbosity=2)
 
     return runner.run(suite).wasSuccessful()
 
 
+def asyncio_test_suite():
+    """
+    Run MDStudio_cli asyncio backend unit tests in a separate process.
+
+    autobahn binds to either Twisted or asyncio once per process, running
+    both backends in one process would skip the tests of one of them.
+    """
+
+    if sys.version_info < (3, 5):
+        return True
+
+    return subprocess.call([sys.executable, os.path.abspath(__file__), 'asyncio']) == 0
+
+
 if __name__ == '__main__':
-    ret = module_test_suite()
+    if sys.argv[1:] == ['asyncio']:
+        ret = module_test_suite(pattern='asyncio_*_test.py')
+    else:
+        ret = module_test_suite()
+        ret = asyncio_test_suite() and ret
     sys.exit(not ret)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the asyncio implementation of the MDStudio CLI endpoint calls
+
+Python 3.5+ only, run in a separate process by the test runner in tests/__main__.py
+"""
+
+import asyncio
+import unittest
+
+from mdstudio_cli.asyncio_calls import budget_call, coalesced_call, policy_call, pool_call
+from mdstudio_cli.byte_budget import ByteBudget
+from mdstudio_cli.call_policy import CallPolicy, CallTimeout, LatencyTracker
+from mdstudio_cli.session_pool import SessionPool
+
+
+class StubEndpoint(object):
+    """
+    Endpoint returning results after a delay per call
+    """
+
+    def __init__(self, delays, fail=()):
+        self.delays = list(delays)
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self):
+        call = self.calls
+        self.calls += 1
+        await asyncio.sleep(self.delays[min(call, len(self.delays) - 1)])
+        if call in self.fail:
+            raise CallTimeout(u'stub', 0)
+        return call
+
+
+class AsyncioPolicyCallTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+
+        self.loop.close()
+
+    def run_call(self, endpoint, policy, tracker=None):
+
+        return self.loop.run_until_complete(policy_call(endpoint, u'stub', policy, tracker=tracker))
+
+    def test_timeout(self):
+
+        endpoint = StubEndpoint([0.5])
+        self.assertRaises(CallTimeout, self.run_call, endpoint, CallPolicy(timeout=0.01))
+
+    def test_retry(self):
+
+        endpoint = StubEndpoint([0.5, 0.5, 0])
+        result = self.run_call(endpoint, CallPolicy(timeout=0.01, retries=2, backoff=0.001))
+        self.assertEqual(result, 2)
+        self.assertEqual(endpoint.calls, 3)
+
+    def test_no_retry_non_retryable(self):
+
+        async def endpoint():
+            raise ValueError('invalid input')
+
+        self.assertRaises(ValueError, self.run_call, endpoint, CallPolicy(retries=3, backoff=0.001))
+
+    def test_hedge(self):
+
+        tracker = LatencyTracker()
+        for _ in range(20):
+            tracker.record(0.01)
+
+        # Slow first request is overtaken by the hedged duplicate
+        endpoint = StubEndpoint([1.0, 0])
+        result = self.run_call(endpoint, CallPolicy(hedge_percentile=50), tracker=tracker)
+        self.assertEqual(result, 1)
+        self.assertEqual(len(tracker), 21)
+
+    def test_hedge_failed_duplicate(self):
+
+        tracker = LatencyTracker()
+        for _ in range(20):
+            tracker.record(0.01)
+
+        # Failure of the hedged duplicate does not fail the call
+        endpoint = StubEndpoint([0.05, 0], fail=(1,))
+        result = self.run_call(endpoint, CallPolicy(hedge_percentile=50), tracker=tracker)
+        self.assertEqual(result, 0)
+
+
+class AsyncioPoolCallTests(unittest.TestCase):
+
+    def test_pool_call(self):
+
+        class SessionStub(object):
+
+            def __init__(self):
+                self.active = 0
+                self.max_active = 0
+
+            async def call(self, uri, request):
+                self.active += 1
+                self.max_active = max(self.active, self.max_active)
+                await asyncio.sleep(0.001)
+                self.active -= 1
+                return request
+
+        sessions = [SessionStub(), SessionStub()]
+        pool = SessionPool(max_outstanding=2)
+        for session in sessions:
+            pool.add(session)
+
+        dispatched = []
+
+        async def run():
+            return await asyncio.gather(*[pool_call(pool, u'stub', i, dispatched=lambda i=i: dispatched.append(i))
+                                          for i in range(10)])
+
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+        self.assertEqual(results, list(range(10)))
+        self.assertEqual(sorted(dispatched), list(range(10)))
+        self.assertEqual(pool.outstanding(), 0)
+        self.assertTrue(all(session.max_active == 2 for session in sessions))
+
+    def test_pool_closed(self):
+
+        class SessionStub(object):
+
+            async def call(self, uri, request):
+                await asyncio.sleep(0.001)
+                return request
+
+        pool = SessionPool(max_outstanding=1)
+        pool.add(SessionStub())
+
+        async def run():
+            calls = [asyncio.ensure_future(pool_call(pool, u'stub', i)) for i in range(2)]
+            await asyncio.sleep(0)
+            pool.close()
+            return await asyncio.gather(*calls, return_exceptions=True)
+
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+        # Call waiting for a session fails, the running call completes
+        self.assertEqual(results[0], 0)
+        self.assertIsInstance(results[1], IOError)
+
+
+class AsyncioBudgetCallTests(unittest.TestCase):
+
+    def test_budget_call(self):
+
+        budget = ByteBudget(max_bytes=100)
+        state = {'used': 0, 'max_used': 0}
+
+        async def call(reservation):
+            nbytes = reservation.nbytes
+            state['used'] += nbytes
+            state['max_used'] = max(state['used'], state['max_used'])
+            await asyncio.sleep(0.001)
+            state['used'] -= nbytes
+            return nbytes
+
+        async def run():
+            sizes = [40, 40, 40, 150, 10]
+            return await asyncio.gather(*[budget_call(budget, n, call) for n in sizes])
+
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+        self.assertEqual(results, [40, 40, 40, 150, 10])
+        self.assertEqual(state['max_used'], 150)
+        self.assertEqual((budget.used, budget.waiting), (0, 0))
+
+    def test_result_charged(self):
+
+        budget = ByteBudget(max_bytes=100)
+        events = []
+
+        async def call(reservation, name):
+            events.append((u'start', name))
+            await asyncio.sleep(0.001)
+            reservation.charge(60)
+            await asyncio.sleep(0.001 if name == u'a' else 0.01)
+            events.append((u'end', name))
+
+        async def run():
+            await asyncio.gather(*[budget_call(budget, 40, lambda r, name=name: call(r, name)) for name in u'abc'])
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+        # Held results of 'a' and 'b' keep 'c' waiting until both finished
+        self.assertEqual(events, [(u'start', u'a'), (u'start', u'b'), (u'end', u'a'), (u'end', u'b'),
+                                  (u'start', u'c'), (u'end', u'c')])
+        self.assertEqual(budget.used, 0)
+
+
+class AsyncioCoalescedCallTests(unittest.TestCase):
+
+    def test_coalesce(self):
+
+        inflight = {}
+        calls = []
+
+        async def call():
+            calls.append(True)
+            await asyncio.sleep(0.001)
+            return {u'output': {u'content': u'ATOM'}}
+
+        async def run():
+            keys = [(u'uri', u'a'), (u'uri', u'a'), (u'uri', u'b'), (u'uri', u'a')]
+            return await asyncio.gather(*[coalesced_call(inflight, key, call) for key in keys])
+
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(results, [{u'output': {u'content': u'ATOM'}}] * 4)
+        self.assertIsNot(results[0][u'output'], results[1][u'output'])
+        self.assertEqual(inflight, {})
+
+    def test_failure(self):
+
+        inflight = {}
+
+        async def call():
+            await asyncio.sleep(0.001)
+            raise ValueError('failed')
+
+        async def run():
+            return await asyncio.gather(*[coalesced_call(inflight, (u'uri', u'a'), call) for _ in range(2)],
+                                        return_exceptions=True)
+
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(run())
+        finally:
+            loop.close()
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(inflight, {})
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI asyncio client
+
+Python 3.5+ only, run in a separate process by the test runner in tests/__main__.py
+"""
+
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from graphit.graph_io.io_jsonschema_format import read_json_schema
+
+from mdstudio_cli.metrics import CALLS
+from mdstudio_cli.schema_cache import SchemaGraphCache
+from mdstudio_cli.schema_classes import CLIORM
+from mdstudio_cli.session_pool import SessionPool
+from mdstudio_cli.session_setup import setup_session
+
+try:
+    from mdstudio_cli.asyncio_client import AsyncioMDStudioClient, check_settings, load_settings
+    HAS_CLIENT = True
+except (ImportError, RuntimeError):
+    # RuntimeError: autobahn already bound to Twisted in this process
+    HAS_CLIENT = False
+
+REQUEST_SCHEMA = {u'type': u'object', u'properties': {u'name': {u'type': u'string'}}}
+
+
+IMPORT_CHECK = """
+import sys
+try:
+    import mdstudio_cli.asyncio_client
+except ImportError:
+    sys.exit(2)
+sys.exit(any(name in sys.modules for name in ('twisted.internet.reactor', 'mdstudio.deferred')))
+"""
+
+
+class AsyncioImportTests(unittest.TestCase):
+
+    def test_no_twisted_reactor(self):
+        """
+        Importing the asyncio client leaves the choice of reactor to the caller
+        """
+
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        status = subprocess.call([sys.executable, '-c', IMPORT_CHECK], cwd=root)
+        if status == 2:
+            self.skipTest('requires MDStudio')
+
+        self.assertEqual(status, 0)
+
+
+@unittest.skipUnless(HAS_CLIENT, 'requires MDStudio')
+class LoadSettingsTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+
+        with open(os.path.join(self.tmpdir, 'settings.yml'), 'w') as outf:
+            outf.write('session:\n  username: cli\n  password: secret\nstatic:\n  vendor: mdgroup\n')
+        with open(os.path.join(self.tmpdir, 'settings.dev.yml'), 'w') as outf:
+            outf.write('session:\n  password: dev\n')
+
+    def tearDown(self):
+
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def test_load(self):
+
+        settings = load_settings(self.tmpdir)
+
+        self.assertEqual(settings['session'], {'username': 'cli', 'password': 'dev'})
+        self.assertEqual(settings['static'], {'vendor': 'mdgroup'})
+
+    def test_default_cwd(self):
+
+        os.chdir(self.tmpdir)
+        self.assertEqual(load_settings()['static'], {'vendor': 'mdgroup'})
+
+    def test_missing(self):
+
+        self.assertEqual(load_settings(os.path.join(self.tmpdir, 'missing')), {})
+
+    def test_check_settings(self):
+
+        check_settings(load_settings(self.tmpdir))
+
+        with self.assertRaises(AttributeError) as context:
+            check_settings({'session': {'username': 'cli'}})
+
+        self.assertIn('session.password', str(context.exception))
+        self.assertIn('static.vendor', str(context.exception))
+
+
+SETTINGS = {'session': {'username': 'cli', 'password': 'secret'}, 'static': {'vendor': 'mdgroup'}}
+
+
+class StubSession(object):
+
+    def __init__(self):
+        self.left = False
+
+    def leave(self):
+        self.left = True
+
+    def is_attached(self):
+        return not self.left
+
+
+@unittest.skipUnless(HAS_CLIENT, 'requires MDStudio')
+class AsyncioConnectTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def connect(self, client, opened):
+
+        async def open_session(url, **extra):
+            self.loop.call_soon(opened, client)
+
+        client._open_session = open_session
+        return self.loop.run_until_complete(client.connect())
+
+    def test_rejected(self):
+
+        client = AsyncioMDStudioClient(settings=SETTINGS)
+        session = StubSession()
+
+        with self.assertRaises(IOError):
+            self.connect(client, lambda c: c.session_lost(session, IOError('wamp.error.not_authorized')))
+        self.assertFalse(client.connected)
+
+    def test_timeout(self):
+
+        client = AsyncioMDStudioClient(settings=SETTINGS, schema_timeout=0.01)
+        session = StubSession()
+
+        with self.assertRaises(IOError):
+            self.connect(client, lambda c: None)
+
+        # Session joining after the timeout is closed
+        client.session_ready(session)
+        self.assertTrue(session.left)
+        self.assertFalse(client.connected)
+
+    def test_missing_settings(self):
+
+        client = AsyncioMDStudioClient(settings={})
+        self.assertRaises(AttributeError, self.loop.run_until_complete, client.connect())
+
+
+@unittest.skipUnless(HAS_CLIENT, 'requires MDStudio')
+class AsyncioPoolTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        settings = dict(SETTINGS, static={'vendor': 'mdgroup', 'cli_pool': {'routers': [u'ws://pool:8080/ws'],
+                                                                              'sessions': 2}})
+        self.client = AsyncioMDStudioClient(settings=settings)
+        self.opened = []
+
+        async def open_session(url, **extra):
+            self.opened.append(url)
+            if extra.get('client'):
+                self.loop.call_soon(self.client.session_ready, StubSession())
+            else:
+                await self.loop.create_future()
+
+        self.client._open_session = open_session
+        self.loop.run_until_complete(self.client.connect())
+
+    def tearDown(self):
+
+        self.client.disconnect()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def test_lazy_open(self):
+
+        # Pool sessions are opened by the first call only
+        self.assertEqual(self.opened, [self.client.url])
+
+        self.client.open_pool()
+        self.client.open_pool()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertEqual(self.opened, [self.client.url] + [u'ws://pool:8080/ws'] * 2)
+
+    def test_disconnect_connecting(self):
+
+        self.client.open_pool()
+        connecting = list(self.client.pool_connecting)
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.client.disconnect()
+        self.loop.run_until_complete(asyncio.sleep(0))
+
+        self.assertTrue(all(task.cancelled() for task in connecting))
+        self.assertTrue(self.client.pool.closed)
+        self.assertFalse(self.client.pool.add(StubSession()))
+
+
+class StubEndpointSession(object):
+    """
+    Pool session echoing the request after a delay per name
+    """
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.requests = []
+
+    async def call(self, uri, request):
+        self.requests.append(request[u'name'])
+        await asyncio.sleep(self.delays.get(request[u'name'], 0.001))
+        if request[u'name'] == u'fail':
+            raise ValueError('invalid input')
+        return {u'name': request[u'name'],
+                u'output': {u'content': u'x' * 100, u'extension': u'txt', u'encoding': u'utf8', u'path': None}}
+
+
+@unittest.skipUnless(HAS_CLIENT, 'requires MDStudio')
+class AsyncioClientCallTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def client(self, delays=None, **config):
+
+        client = AsyncioMDStudioClient(settings=SETTINGS, **config)
+        setup_session(client, client.config)
+
+        async def schema(uri):
+            request = read_json_schema(REQUEST_SCHEMA)
+            request.orm = CLIORM
+            return request
+
+        client.schema = schema
+        client.session = StubSession()
+        client.pool = SessionPool()
+        client.endpoint = StubEndpointSession(delays or {})
+        client.pool.add(client.endpoint)
+
+        return client
+
+    def test_coalesce_releases_reservation(self):
+
+        client = self.client(coalesce=True)
+        calls = CALLS.value()
+        used = []
+
+        async def run():
+            calls = [asyncio.ensure_future(client.call(u'uri', name=u'a')) for _ in range(3)]
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            used.append(client.budget.used)
+            return await asyncio.gather(*calls)
+
+        results = self.loop.run_until_complete(run())
+
+        # Attached calls send nothing and hold no payload reservation
+        self.assertEqual(client.endpoint.requests, [u'a'])
+        self.assertEqual(CALLS.value() - calls, 1)
+        self.assertEqual(used, [1])
+        self.assertEqual([result[u'name'] for result in results], [u'a'] * 3)
+        self.assertEqual(client.budget.used, 0)
+
+    def test_map_order(self):
+
+        client = self.client(delays={u'a': 0.02})
+        results = self.loop.run_until_complete(client.map(u'uri', [{u'name': u'a'}, {u'name': u'b'}]))
+
+        # Results in input order regardless of completion order
+        self.assertEqual(client.endpoint.requests, [u'a', u'b'])
+        self.assertEqual([result[u'name'] for result in results], [u'a', u'b'])
+        self.assertEqual(client.budget.used, 0)
+
+    def test_map_failure(self):
+
+        client = self.client()
+
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(client.map(u'uri', [{u'name': u'a'}, {u'name': u'fail'}]))
+
+    def test_map_spill(self):
+
+        client = self.client(spill_threshold=0.00001)
+
+        result = self.loop.run_until_complete(client.call(u'uri', name=u'a'))
+        self.assertEqual(result[u'output'][u'content'], u'x' * 100)
+
+        results = self.loop.run_until_complete(client.map(u'uri', [{u'name': u'a'}]))
+        spilled = results[0][u'output'][u'spilled']
+        self.addCleanup(os.remove, spilled)
+
+        self.assertIsNone(results[0][u'output'][u'content'])
+        with open(spilled) as inf:
+            self.assertEqual(inf.read(), u'x' * 100)
+
+
+class StubCatalog(object):
+
+    path = None
+
+    def __init__(self):
+        self.saved = 0
+
+    def add(self, uri, entry):
+        pass
+
+    def save(self):
+        self.saved += 1
+
+
+@unittest.skipUnless(HAS_CLIENT, 'requires MDStudio')
+class AsyncioClientSchemaTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+
+        asyncio.set_event_loop(None)
+        self.loop.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_concurrent_schema(self):
+
+        client = AsyncioMDStudioClient(settings=SETTINGS)
+        setup_session(client, client.config)
+        client.session = StubSession()
+        client.catalog = StubCatalog()
+        client.schema_graphs = SchemaGraphCache(orm=CLIORM, path=self.tmpdir)
+
+        class StubSchemaParser(object):
+
+            requests = 0
+
+            async def get(self, uri=None, **kwargs):
+                self.requests += 1
+                await asyncio.sleep(0.001)
+                return dict(REQUEST_SCHEMA)
+
+        client.schema_parser = StubSchemaParser()
+
+        async def run():
+            return await asyncio.gather(*[client.schema(u'uri') for _ in range(3)])
+
+        requests = self.loop.run_until_complete(run())
+
+        # Schema retrieved, compiled and registered once, every caller gets its own graph
+        self.assertEqual((client.schema_parser.requests, client.catalog.saved), (1, 1))
+        self.assertEqual(len(set(id(request) for request in requests)), 3)
+        self.assertEqual(client._schema_requests, {})
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI in-flight byte budget and result spilling
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mdstudio_cli.byte_budget import (BudgetReservation, ByteBudget, byte_length, file_content_size, input_size,
+                                      payload_size, spill_results)
+
+try:
+    from twisted.internet import defer
+    from mdstudio_cli.deferred_calls import budget_call
+    HAS_TWISTED = True
+except ImportError:
+    HAS_TWISTED = False
+
+
+class ByteBudgetTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.budget = ByteBudget(max_bytes=100)
+        self.admitted = []
+
+    def acquire(self, nbytes):
+
+        callback = lambda: self.admitted.append(nbytes)
+        self.budget.acquire(nbytes, callback)
+        return callback
+
+    def test_limit(self):
+
+        for nbytes in (60, 40, 10):
+            self.acquire(nbytes)
+
+        self.assertEqual(self.admitted, [60, 40])
+        self.assertEqual((self.budget.used, self.budget.waiting), (100, 1))
+
+        self.budget.release(60)
+        self.assertEqual(self.admitted, [60, 40, 10])
+        self.assertEqual((self.budget.used, self.budget.waiting), (50, 0))
+
+    def test_fifo(self):
+
+        self.acquire(90)
+        self.acquire(20)
+        self.acquire(5)
+
+        self.assertEqual(self.admitted, [90])
+
+    def test_oversized(self):
+
+        self.acquire(10)
+        self.acquire(250)
+        self.assertEqual(self.admitted, [10])
+
+        self.budget.release(10)
+        self.assertEqual(self.admitted, [10, 250])
+
+    def test_discard(self):
+
+        self.acquire(100)
+        waiting = self.acquire(10)
+
+        self.assertTrue(self.budget.discard(waiting))
+        self.assertFalse(self.budget.discard(waiting))
+
+        self.budget.release(100)
+        self.assertEqual((self.admitted, self.budget.used), ([100], 0))
+
+    def test_unlimited(self):
+
+        budget = ByteBudget()
+        for _ in range(3):
+            budget.acquire(10 ** 9, lambda: self.admitted.append(True))
+
+        self.assertEqual(len(self.admitted), 3)
+
+    def test_reservation(self):
+
+        self.acquire(60)
+        reservation = BudgetReservation(self.budget, 60)
+
+        # Charged result bytes delay waiting calls until released
+        reservation.charge(30)
+        self.acquire(20)
+        self.assertEqual((self.admitted, self.budget.used), ([60], 90))
+
+        reservation.release()
+        reservation.release()
+        self.assertEqual((self.admitted, self.budget.used), ([60, 20], 20))
+
+
+@unittest.skipUnless(HAS_TWISTED, 'Twisted and MDStudio not available')
+class BudgetCallTests(unittest.TestCase):
+
+    def test_budget_call(self):
+
+        budget = ByteBudget(max_bytes=100)
+        calls = []
+
+        def call(reservation):
+            deferred = defer.Deferred()
+            calls.append((reservation, deferred))
+            return deferred
+
+        results = []
+        for nbytes in (60, 30, 20):
+            budget_call(budget, nbytes, call).addCallback(results.append)
+
+        self.assertEqual(len(calls), 2)
+
+        # Result charged to the reservation until the call finished
+        calls[0][0].charge(50)
+        self.assertEqual(budget.used, 140)
+        calls[1][1].callback(u'second')
+        self.assertEqual((len(calls), budget.used), (2, 110))
+
+        calls[0][1].callback(u'first')
+        self.assertEqual((len(calls), budget.used), (3, 20))
+
+        calls[2][1].callback(u'third')
+        self.assertEqual(results, [u'second', u'first', u'third'])
+        self.assertEqual((budget.used, budget.waiting), (0, 0))
+
+    def test_cancel_waiting(self):
+
+        budget = ByteBudget(max_bytes=100)
+        budget.acquire(100, lambda: None)
+
+        deferred = budget_call(budget, 10, lambda reservation: defer.succeed(True))
+        deferred.addErrback(lambda failure: None)
+        deferred.cancel()
+
+        self.assertEqual((budget.used, budget.waiting), (100, 0))
+
+
+class PayloadSizeTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmpdir)
+
+    def test_payload_size(self):
+
+        payload = {u'mol': {u'content': u'ATOM', u'extension': u'pdb', u'path': None}, u'ids': [u'a', u'bc'], u'n': 3}
+        self.assertEqual(payload_size(payload), 10)
+
+        # Encoded length of text
+        self.assertEqual(byte_length(u'\u00c5ngstr\u00f6m'), 10)
+        self.assertEqual(byte_length(b'ATOM'), 4)
+        self.assertEqual(payload_size({u'unit': u'\u00c5'}), 2)
+
+    def test_file_content_size(self):
+
+        payload = {u'mol': {u'content': u'\u00c5TOM', u'extension': u'pdb', u'encoding': u'utf8', u'path': None},
+                   u'mols': [{u'content': u'ATOM', u'extension': u'pdb', u'encoding': u'utf8', u'path': None},
+                             {u'content': None, u'extension': u'pdb', u'encoding': u'utf8', u'path': u'mol.pdb'}],
+                   u'output_format': u'mol2'}
+        self.assertEqual(file_content_size(payload), 9)
+
+    def test_input_size(self):
+
+        path = os.path.join(self.tmpdir, 'mol.pdb')
+        with open(path, 'w') as outf:
+            outf.write('x' * 42)
+
+        self.assertEqual(input_size({u'mol': path, u'output_format': u'mol2', u'charge': 1}), 46)
+
+    def test_spill_results(self):
+
+        results = {u'output': {u'content': u'x' * 20, u'extension': u'mol2', u'encoding': u'utf8', u'path': None},
+                   u'logs': [{u'content': u'short', u'extension': u'log', u'encoding': u'utf8', u'path': None}],
+                   u'status': u'completed'}
+
+        spill_results(results, 10)
+        spilled = results[u'output'][u'spilled']
+        try:
+            self.assertIsNone(results[u'output'][u'content'])
+            self.assertTrue(spilled.endswith('.mol2'))
+            with open(spilled) as inf:
+                self.assertEqual(inf.read(), u'x' * 20)
+
+            self.assertEqual(results[u'logs'][0][u'content'], u'short')
+            self.assertNotIn(u'spilled', results[u'logs'][0])
+        finally:
+            os.remove(spilled)
+
+    def test_spill_disabled(self):
+
+        results = {u'output': {u'content': u'x' * 20, u'extension': u'mol2', u'encoding': u'utf8', u'path': None}}
+        self.assertEqual(spill_results(results, None)[u'output'][u'content'], u'x' * 20)
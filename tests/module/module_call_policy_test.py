@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI call timeout, retry and hedging policy
+"""
+
+import unittest
+
+from mdstudio_cli.call_policy import CallPolicy, CallTimeout, LatencyTracker
+
+try:
+    from twisted.internet import defer, task
+    from mdstudio_cli.deferred_calls import _single_call, policy_call
+    HAS_TWISTED = True
+except ImportError:
+    HAS_TWISTED = False
+
+
+class ApplicationErrorStub(Exception):
+
+    def __init__(self, error):
+        super(ApplicationErrorStub, self).__init__(error)
+        self.error = error
+
+
+class LatencyTrackerTests(unittest.TestCase):
+
+    def test_percentile(self):
+
+        tracker = LatencyTracker()
+        self.assertIsNone(tracker.percentile(95))
+
+        for latency in range(1, 101):
+            tracker.record(latency / 100.0)
+
+        self.assertEqual(len(tracker), 100)
+        self.assertAlmostEqual(tracker.percentile(0), 0.01)
+        self.assertAlmostEqual(tracker.percentile(50), 0.51)
+        self.assertAlmostEqual(tracker.percentile(100), 1.0)
+
+    def test_sliding_window(self):
+
+        tracker = LatencyTracker(window=3)
+        for latency in (10, 1, 2, 3):
+            tracker.record(latency)
+
+        self.assertEqual(len(tracker), 3)
+        self.assertEqual(tracker.percentile(100), 3)
+
+
+class CallPolicyTests(unittest.TestCase):
+
+    def test_from_config(self):
+
+        policy = CallPolicy.from_config({'call_timeout': 5.0, 'retries': 3, 'backoff': 0.1, 'hedge': 95})
+        self.assertEqual(policy.timeout, 5.0)
+        self.assertEqual(policy.retries, 3)
+        self.assertEqual(policy.hedge_percentile, 95)
+
+        policy = CallPolicy.from_config({'schema_timeout': 10.0}, timeout_key='schema_timeout', retries=2)
+        self.assertEqual(policy.timeout, 10.0)
+        self.assertEqual(policy.retries, 2)
+
+    def test_is_retryable(self):
+
+        policy = CallPolicy()
+        self.assertTrue(policy.is_retryable(CallTimeout(u'mdgroup.test.endpoint.call', 1.0)))
+        self.assertTrue(policy.is_retryable(ApplicationErrorStub(u'wamp.error.canceled')))
+        self.assertFalse(policy.is_retryable(ApplicationErrorStub(u'mdstudio.error.invalid_input')))
+        self.assertFalse(policy.is_retryable(ValueError()))
+
+    def test_backoff_delay(self):
+
+        policy = CallPolicy(backoff=1.0, max_backoff=5.0)
+        for attempt in range(10):
+            delay = policy.backoff_delay(attempt)
+            self.assertTrue(0 <= delay <= min(5.0, 2 ** attempt))
+
+    def test_hedge_delay(self):
+
+        tracker = LatencyTracker()
+        for latency in range(10):
+            tracker.record(latency)
+
+        self.assertIsNone(CallPolicy().hedge_delay(tracker))
+        self.assertIsNone(CallPolicy(hedge_percentile=90, hedge_min_samples=20).hedge_delay(tracker))
+        self.assertEqual(CallPolicy(hedge_percentile=90, hedge_min_samples=5).hedge_delay(tracker), 8)
+
+        # Fixed delay until there are enough latency observations
+        self.assertEqual(CallPolicy(fixed_hedge_delay=2.0).hedge_delay(tracker), 2.0)
+        self.assertEqual(CallPolicy(hedge_percentile=90, fixed_hedge_delay=2.0).hedge_delay(tracker), 2.0)
+        self.assertEqual(CallPolicy(hedge_percentile=90, hedge_min_samples=5, fixed_hedge_delay=2.0).hedge_delay(
+                         tracker), 8)
+        self.assertEqual(CallPolicy.from_config({'hedge_delay': 1.5}).fixed_hedge_delay, 1.5)
+
+
+class StubEndpoint(object):
+    """
+    Endpoint with calls completed by the test
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.cancelled = []
+
+    def __call__(self):
+        deferred = defer.Deferred(lambda d: self.cancelled.append(self.calls.index(d)))
+        self.calls.append(deferred)
+        return deferred
+
+
+@unittest.skipUnless(HAS_TWISTED, 'Twisted and MDStudio not available')
+class PolicyCallTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.clock = task.Clock()
+        self.endpoint = StubEndpoint()
+        self.results = []
+        self.failures = []
+
+    def policy_call(self, policy, tracker=None):
+
+        deferred = policy_call(self.endpoint, u'stub', policy, tracker=tracker, clock=self.clock)
+        deferred.addCallbacks(self.results.append, self.failures.append)
+
+    def test_single_call_timeout(self):
+
+        _single_call(self.endpoint, u'stub', 1.0, self.clock).addErrback(self.failures.append)
+
+        self.clock.advance(0.9)
+        self.assertEqual(self.failures, [])
+
+        self.clock.advance(0.1)
+        self.assertTrue(self.failures[0].check(CallTimeout))
+        self.assertEqual(self.endpoint.cancelled, [0])
+
+    def test_single_call_result(self):
+
+        _single_call(self.endpoint, u'stub', 1.0, self.clock).addCallback(self.results.append)
+        self.endpoint.calls[0].callback(1)
+
+        self.assertEqual(self.results, [1])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_retry_backoff(self):
+
+        policy = CallPolicy(timeout=1.0, retries=2)
+        policy.backoff_delay = lambda attempt: 0.5 * 2 ** attempt
+
+        tracker = LatencyTracker()
+        self.policy_call(policy, tracker=tracker)
+
+        # Timeout after 1 sec, retry after 0.5 sec backoff
+        self.clock.advance(1.0)
+        self.assertEqual(len(self.endpoint.calls), 1)
+        self.clock.advance(0.5)
+        self.assertEqual(len(self.endpoint.calls), 2)
+
+        # Timeout after 1 sec, retry after 1 sec backoff
+        self.clock.advance(1.0)
+        self.clock.advance(0.9)
+        self.assertEqual(len(self.endpoint.calls), 2)
+        self.clock.advance(0.1)
+        self.assertEqual(len(self.endpoint.calls), 3)
+
+        self.clock.advance(0.25)
+        self.endpoint.calls[2].callback(u'done')
+
+        self.assertEqual(self.results, [u'done'])
+        self.assertEqual(self.endpoint.cancelled, [0, 1])
+        self.assertEqual(tracker.percentile(50), 0.25)
+
+    def test_retries_exhausted(self):
+
+        policy = CallPolicy(timeout=1.0, retries=1, backoff=0.1)
+        self.policy_call(policy)
+
+        self.clock.pump([1.0, 0.1, 1.0])
+
+        self.assertEqual(len(self.endpoint.calls), 2)
+        self.assertTrue(self.failures[0].check(CallTimeout))
+
+    def test_no_retry_non_retryable(self):
+
+        self.policy_call(CallPolicy(retries=3))
+        self.endpoint.calls[0].errback(ValueError('invalid input'))
+
+        self.assertEqual(len(self.endpoint.calls), 1)
+        self.assertTrue(self.failures[0].check(ValueError))
+
+    def test_hedge_winner(self):
+
+        self.policy_call(CallPolicy(fixed_hedge_delay=0.2))
+
+        self.clock.advance(0.1)
+        self.assertEqual(len(self.endpoint.calls), 1)
+        self.clock.advance(0.1)
+        self.assertEqual(len(self.endpoint.calls), 2)
+
+        # Hedged duplicate wins, the first request is cancelled
+        self.endpoint.calls[1].callback(u'hedged')
+
+        self.assertEqual(self.results, [u'hedged'])
+        self.assertEqual(self.endpoint.cancelled, [0])
+
+    def test_hedge_not_needed(self):
+
+        self.policy_call(CallPolicy(fixed_hedge_delay=0.2))
+
+        self.clock.advance(0.1)
+        self.endpoint.calls[0].callback(u'first')
+        self.clock.advance(1.0)
+
+        self.assertEqual(self.results, [u'first'])
+        self.assertEqual(len(self.endpoint.calls), 1)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_hedge_failed_duplicate(self):
+
+        self.policy_call(CallPolicy(fixed_hedge_delay=0.2))
+        self.clock.advance(0.2)
+
+        # Failure of one request does not fail the call while another is pending
+        self.endpoint.calls[1].errback(ValueError('failed'))
+        self.assertEqual(self.failures, [])
+
+        self.endpoint.calls[0].callback(u'first')
+        self.assertEqual(self.results, [u'first'])
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI local endpoint catalog
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mdstudio_cli.catalog import EndpointCatalog, complete
+from mdstudio_cli.cli_parser import cli_option_strings
+from mdstudio_cli.io_utils import CACHE_DIR_ENV
+
+CONVERT = {u'title': u'Convert structures', u'description': u'Convert structure file formats',
+           u'arguments': {u'mol': {u'required': True, u'type': u'object', u'default': u'', u'description': u''},
+                          u'output_format': {u'required': False, u'type': u'string', u'default': u'pdb',
+                                             u'description': u'Output format'}}}
+TOOLKITS = {u'title': u'Supported toolkits', u'description': u'', u'arguments': {}}
+
+
+class EndpointCatalogTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'catalog.json')
+
+        self.catalog = EndpointCatalog(path=self.path)
+        self.catalog.add(u'mdgroup.lie_structures.endpoint.convert', CONVERT)
+        self.catalog.add(u'mdgroup.lie_structures.endpoint.supported_toolkits', TOOLKITS)
+        self.catalog.save()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmpdir)
+
+    def test_persistence(self):
+
+        catalog = EndpointCatalog(path=self.path)
+        self.assertEqual(len(catalog), 2)
+        self.assertEqual(catalog.get(u'mdgroup.lie_structures.endpoint.convert'), CONVERT)
+
+    def test_concurrent_save(self):
+
+        other = EndpointCatalog(path=self.path)
+        self.catalog.add(u'mdgroup.lie_md.endpoint.gromacs', TOOLKITS)
+        self.catalog.save()
+        other.add(u'mdgroup.lie_pylie.endpoint.liedeltag', TOOLKITS)
+        other.save()
+
+        self.assertEqual(len(EndpointCatalog(path=self.path)), 4)
+
+    def test_corrupt_file(self):
+
+        with open(self.path, 'w') as outf:
+            outf.write('{"version": 1, "endpoints": {')
+
+        # Corrupt catalog is moved aside instead of overwritten
+        catalog = EndpointCatalog(path=self.path)
+        self.assertEqual(len(catalog), 0)
+        self.assertFalse(os.path.exists(self.path))
+        with open(self.path + '.corrupt') as inf:
+            self.assertEqual(inf.read(), '{"version": 1, "endpoints": {')
+
+        catalog.add(u'mdgroup.lie_md.endpoint.gromacs', TOOLKITS)
+        catalog.save()
+        self.assertEqual(len(EndpointCatalog(path=self.path)), 1)
+
+    def test_lazy_cache_dir(self):
+
+        cache = os.path.join(self.tmpdir, 'cache')
+        environ = dict(os.environ)
+        os.environ[CACHE_DIR_ENV] = cache
+        try:
+            catalog = EndpointCatalog()
+            self.assertFalse(os.path.exists(cache))
+
+            catalog.add(u'mdgroup.lie_md.endpoint.gromacs', TOOLKITS)
+            catalog.save()
+            self.assertTrue(os.path.isfile(os.path.join(cache, 'catalog.json')))
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+    def test_search(self):
+
+        self.assertEqual(len(self.catalog.search()), 2)
+        self.assertEqual(self.catalog.search(u'CONVERT'), [u'mdgroup.lie_structures.endpoint.convert'])
+        self.assertEqual(self.catalog.search(u'output_format'), [u'mdgroup.lie_structures.endpoint.convert'])
+        self.assertEqual(self.catalog.search(u'gromacs'), [])
+
+    def test_complete(self):
+
+        uri = u'mdgroup.lie_structures.endpoint.convert'
+
+        self.assertEqual(complete(['mdstudio-cli', 'load'], 'load', 'mdstudio-cli', catalog=self.catalog),
+                         ['loadtest'])
+        self.assertEqual(complete(['mdstudio-cli', '-u', 'mdgroup.lie_structures.endpoint.c'],
+                                  'mdgroup.lie_structures.endpoint.c', '-u', catalog=self.catalog), [uri])
+
+        words = ['mdstudio-cli', '-u', uri, '--out']
+        self.assertEqual(complete(words, '--out', uri, options=cli_option_strings(words), catalog=self.catalog),
+                         ['--output_format'])
+
+        words = ['mdstudio-cli', 'loadtest', '-u', uri, '--cli_d']
+        self.assertEqual(complete(words, '--cli_d', uri, options=cli_option_strings(words), catalog=self.catalog),
+                         ['--cli_duration'])
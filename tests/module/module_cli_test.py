@@ -4,8 +4,12 @@
 Unit tests for MDStudio CLI methods
 """
 
+import os
+import sys
 import unittest
 
+from mdstudio_cli.cli_parser import mdstudio_cli_parser
+
 
 class MDStudioCliTests(unittest.TestCase):
 
@@ -13,3 +17,53 @@ class MDStudioCliTests(unittest.TestCase):
 
         print('We do realy need some tests here :-)')
         self.assertTrue(True)
+
+
+class CliParserTests(unittest.TestCase):
+
+    uri = 'mdgroup.lie_structures.endpoint.convert'
+
+    def test_endpoint_arguments(self):
+
+        # Prefixes and names of CLI options without the reserved prefix are
+        # endpoint arguments
+        options = mdstudio_cli_parser(['-u', self.uri, '--schema', 's.json', '--file', 'a.pdb', '--hedge', '95',
+                                       '--call_timeout', '5', '--metrics', 'all'])
+
+        self.assertEqual(options['package_config'], {'schema': 's.json', 'file': 'a.pdb', 'hedge': '95',
+                                                     'call_timeout': '5', 'metrics': 'all'})
+        self.assertIsNone(options['call_timeout'])
+        self.assertIsNone(options['hedge'])
+
+    def test_cli_options(self):
+
+        options = mdstudio_cli_parser(['-u', self.uri, '-i', '--cli_call_timeout', '5', '--cli_file_cache', '8',
+                                       '--mol', 'mol.pdb'])
+
+        self.assertTrue(options['get_endpoint_info'])
+        self.assertEqual(options['call_timeout'], 5.0)
+        self.assertEqual(options['file_cache'], 8.0)
+        self.assertEqual(options['package_config'], {'mol': 'mol.pdb'})
+
+    def test_reserved_prefix(self):
+
+        # Abbreviated or misspelled CLI options are rejected
+        with open(os.devnull, 'w') as devnull:
+            stderr, sys.stderr = sys.stderr, devnull
+            try:
+                self.assertRaises(SystemExit, mdstudio_cli_parser, ['-u', self.uri, '--cli_call', '5'])
+                self.assertRaises(SystemExit, mdstudio_cli_parser, ['-u', self.uri, '--cli_timeout=5'])
+            finally:
+                sys.stderr = stderr
+
+    def test_offline(self):
+
+        self.assertTrue(mdstudio_cli_parser(['-i', '--cli_offline', '-u', self.uri])['offline'])
+
+        # Endpoint calls require a router connection
+        with open(os.devnull, 'w') as devnull:
+            stderr, sys.stderr = sys.stderr, devnull
+            try:
+                self.assertRaises(SystemExit, mdstudio_cli_parser, ['--cli_offline', '-u', self.uri, '--mol', 'a'])
+            finally:
+                sys.stderr = stderr
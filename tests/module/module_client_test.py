@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI Twisted Python client
+"""
+
+import unittest
+
+try:
+    from twisted.internet import defer, task
+    from mdstudio_cli.client import MDStudioClient
+    from mdstudio_cli.session_setup import CLIENT_DEFAULTS
+    HAS_CLIENT = True
+except ImportError:
+    HAS_CLIENT = False
+
+
+class StubSession(object):
+    """
+    CLI session with endpoint calls completed by the test
+    """
+
+    spill_threshold = None
+
+    def __init__(self):
+        self.calls = []
+        self.closed = False
+        self.left = False
+
+    def call_endpoint(self, uri, package_config, process=None):
+        deferred = defer.Deferred()
+        if process is not None:
+            deferred.addCallback(process)
+        self.calls.append((package_config, deferred))
+        return deferred
+
+    def close_pool(self):
+        pass
+
+    def disconnect(self):
+        self.closed = True
+
+    def leave(self):
+        self.left = True
+
+
+@unittest.skipUnless(HAS_CLIENT, 'requires Twisted')
+class MDStudioClientTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.session = StubSession()
+        self.client = MDStudioClient(call_timeout=60)
+
+        # Session joined
+        self.client._ready = defer.Deferred()
+        self.client.session_ready(self.session)
+
+    def test_config(self):
+
+        self.assertEqual(self.client.config[u'call_timeout'], 60)
+        self.assertEqual(dict(self.client.config, call_timeout=None), CLIENT_DEFAULTS)
+
+    def test_not_connected(self):
+
+        self.assertRaises(IOError, MDStudioClient().call, u'uri')
+
+    def test_call(self):
+
+        results = []
+        self.client.call(u'uri', {u'mol': u'mol.pdb'}, output_format=u'mol2').addCallback(results.append)
+
+        self.assertEqual(self.session.calls[0][0], {u'mol': u'mol.pdb', u'output_format': u'mol2'})
+
+        self.session.calls[0][1].callback({u'output': 1})
+        self.assertEqual(results, [{u'output': 1}])
+
+    def test_map_order(self):
+
+        results = []
+        self.client.map(u'uri', [{u'n': 0}, {u'n': 1}, {u'n': 2}]).addCallback(results.extend)
+
+        # Results in input order regardless of completion order
+        for package_config, deferred in reversed(self.session.calls):
+            deferred.callback(package_config[u'n'])
+
+        self.assertEqual(results, [0, 1, 2])
+
+    def test_map_failure(self):
+
+        failures = []
+        self.client.map(u'uri', [{u'n': 0}, {u'n': 1}]).addErrback(failures.append)
+
+        self.session.calls[1][1].errback(ValueError('invalid input'))
+        self.session.calls[0][1].callback(0)
+
+        self.assertEqual(len(failures), 1)
+        failures[0].trap(defer.FirstError)
+        self.assertIsInstance(failures[0].value.subFailure.value, ValueError)
+
+    def test_disconnect(self):
+
+        self.client.disconnect()
+
+        self.assertTrue(self.session.closed)
+        self.assertFalse(self.client.connected)
+
+
+@unittest.skipUnless(HAS_CLIENT, 'requires Twisted')
+class MDStudioConnectTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.client = MDStudioClient(schema_timeout=10)
+        self.client.clock = task.Clock()
+        self.client._open_session = lambda: defer.succeed(None)
+
+        self.failures = []
+        self.client.connect().addErrback(self.failures.append)
+
+    def test_connect(self):
+
+        session = StubSession()
+        results = []
+        self.client._ready.addCallback(results.append)
+        self.client.session_ready(session)
+
+        self.assertEqual(results, [self.client])
+        self.assertIs(self.client.session, session)
+
+        # No timeout once connected
+        self.client.clock.advance(10)
+        self.assertEqual(self.failures, [])
+
+    def test_rejected(self):
+
+        self.client.session_lost(StubSession(), IOError('Session left realm mdstudio: wamp.error.not_authorized'))
+
+        self.assertEqual(len(self.failures), 1)
+        self.failures[0].trap(IOError)
+        self.assertFalse(self.client.connected)
+
+    def test_timeout(self):
+
+        self.client.clock.advance(10)
+
+        self.assertEqual(len(self.failures), 1)
+        self.failures[0].trap(IOError)
+
+        # Session joining late leaves
+        session = StubSession()
+        self.client.session_ready(session)
+
+        self.assertTrue(session.left)
+        self.assertFalse(self.client.connected)
+
+    def test_disconnect_connecting(self):
+
+        self.client.disconnect()
+
+        session = StubSession()
+        self.client.session_ready(session)
+
+        self.assertTrue(session.left)
+        self.assertFalse(self.client.connected)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI coalescing of identical calls in flight
+"""
+
+import unittest
+
+from mdstudio_cli.coalescing import request_key
+
+try:
+    from twisted.internet import defer
+    from mdstudio_cli.deferred_calls import coalesced_call
+    HAS_TWISTED = True
+except ImportError:
+    HAS_TWISTED = False
+
+
+class RequestKeyTests(unittest.TestCase):
+
+    uri = u'mdgroup.lie_structures.endpoint.convert'
+
+    def test_canonical(self):
+
+        first = {u'mol': {u'content': u'ATOM', u'extension': u'pdb'}, u'output_format': u'mol2'}
+        second = {u'output_format': u'mol2', u'mol': {u'extension': u'pdb', u'content': u'ATOM'}}
+
+        self.assertEqual(request_key(self.uri, first), request_key(self.uri, second))
+
+    def test_distinct(self):
+
+        payload = {u'output_format': u'mol2'}
+
+        self.assertNotEqual(request_key(self.uri, payload), request_key(self.uri, {u'output_format': u'sdf'}))
+        self.assertNotEqual(request_key(self.uri, payload), request_key(u'mdgroup.other.endpoint.convert', payload))
+
+
+@unittest.skipUnless(HAS_TWISTED, 'requires Twisted')
+class CoalescedCallTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.inflight = {}
+        self.calls = []
+
+    def call(self):
+
+        deferred = defer.Deferred()
+        self.calls.append(deferred)
+        return deferred
+
+    def test_coalesce(self):
+
+        results = []
+        for _ in range(3):
+            coalesced_call(self.inflight, (u'uri', u'key'), self.call).addCallback(results.append)
+
+        self.assertEqual(len(self.calls), 1)
+
+        value = {u'output': {u'content': u'ATOM'}}
+        self.calls[0].callback(value)
+
+        self.assertEqual(results, [value] * 3)
+        self.assertIs(results[0], value)
+        self.assertIsNot(results[1][u'output'], results[2][u'output'])
+        self.assertEqual(self.inflight, {})
+
+    def test_failure(self):
+
+        failures = []
+        for _ in range(2):
+            coalesced_call(self.inflight, (u'uri', u'key'), self.call).addErrback(failures.append)
+
+        self.calls[0].errback(ValueError('failed'))
+
+        self.assertEqual(len(failures), 2)
+        self.assertEqual(self.inflight, {})
+
+    def test_cancel_waiter(self):
+
+        first = coalesced_call(self.inflight, (u'uri', u'key'), self.call)
+        second = coalesced_call(self.inflight, (u'uri', u'key'), self.call)
+        first.addErrback(lambda failure: None)
+        first.cancel()
+
+        results = []
+        second.addCallback(results.append)
+        self.calls[0].callback(1)
+
+        self.assertEqual(results, [1])
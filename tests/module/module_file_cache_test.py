@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI file content cache
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mdstudio_cli.file_cache import FileContentCache
+
+
+def read_file(abspath):
+
+    with open(abspath) as inf:
+        return {u'path': abspath, u'content': inf.read()}
+
+
+class FileContentCacheTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = FileContentCache(max_bytes=100)
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, content):
+
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as outf:
+            outf.write(content)
+        return path
+
+    def test_hit(self):
+
+        path = self.write('mol.pdb', 'ATOM')
+        first = self.cache.get(path, read_file)
+        second = self.cache.get(path, read_file)
+
+        self.assertEqual(first, second)
+        self.assertEqual(second[u'content'], 'ATOM')
+        self.assertEqual((self.cache.hits, self.cache.misses, self.cache.size), (1, 1, 4))
+
+    def test_changed_file(self):
+
+        path = self.write('mol.pdb', 'ATOM')
+        self.cache.get(path, read_file)
+        self.write('mol.pdb', 'HETATM')
+
+        self.assertEqual(self.cache.get(path, read_file)[u'content'], 'HETATM')
+        self.assertEqual((self.cache.misses, self.cache.size, len(self.cache)), (2, 6, 1))
+
+    def test_eviction(self):
+
+        paths = [self.write('mol{0}.pdb'.format(i), 'x' * 40) for i in range(3)]
+        for path in paths:
+            self.cache.get(path, read_file)
+
+        self.assertEqual((len(self.cache), self.cache.size), (2, 80))
+
+        self.cache.get(paths[0], read_file)
+        self.assertEqual(self.cache.misses, 4)
+
+    def test_oversized_file(self):
+
+        path = self.write('big.pdb', 'x' * 101)
+        self.assertEqual(len(self.cache.get(path, read_file)[u'content']), 101)
+        self.assertEqual((len(self.cache), self.cache.size), (0, 0))
+
+    def test_copy(self):
+
+        path = self.write('mol.pdb', 'ATOM')
+        self.cache.get(path, read_file)[u'content'] = None
+
+        self.assertEqual(self.cache.get(path, read_file)[u'content'], 'ATOM')
+
+    def test_clear(self):
+
+        path = self.write('mol.pdb', 'ATOM')
+        self.cache.get(path, read_file)
+        self.cache.clear(max_bytes=10)
+
+        self.assertEqual((len(self.cache), self.cache.size, self.cache.max_bytes), (0, 0, 10))
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI load test mode
+"""
+
+import logging
+import unittest
+
+from mdstudio_cli.cli_parser import mdstudio_cli_parser
+from mdstudio_cli.loadtest import LoadTestStats
+
+try:
+    from twisted.internet import task
+    from mdstudio_cli.deferred_calls import pool_call, run_load
+    from mdstudio_cli.session_pool import SessionPool
+    HAS_TWISTED = True
+except ImportError:
+    HAS_TWISTED = False
+
+
+class ApplicationErrorStub(Exception):
+
+    def __init__(self, error):
+        super(ApplicationErrorStub, self).__init__(error)
+        self.error = error
+
+
+class LoadTestParserTests(unittest.TestCase):
+
+    def test_loadtest_mode(self):
+
+        options = mdstudio_cli_parser(['loadtest', '-u', 'mdgroup.test.endpoint.call', '--cli_duration', '5',
+                                       '--cli_rate', '20', '--mol', 'mol.pdb'])
+
+        self.assertEqual(options['mode'], 'loadtest')
+        self.assertEqual(options['duration'], 5.0)
+        self.assertEqual(options['rate'], 20.0)
+        self.assertIsNone(options['concurrency'])
+        self.assertEqual(options['package_config'], {'mol': 'mol.pdb'})
+
+    def test_call_mode(self):
+
+        options = mdstudio_cli_parser(['-u', 'mdgroup.test.endpoint.call', '--duration', '5'])
+
+        self.assertEqual(options['mode'], 'call')
+        self.assertEqual(options['package_config'], {'duration': '5'})
+
+
+class LoadTestStatsTests(unittest.TestCase):
+
+    def test_summary(self):
+
+        stats = LoadTestStats()
+        stats.start(0.0)
+        for i in range(1, 101):
+            stats.record(i / 1000.0)
+        stats.record(0.5, error=ApplicationErrorStub(u'wamp.error.canceled'))
+        stats.record(20.0, error=ValueError())
+        stats.record(0.1, queue_wait=0.5)
+        stats.stop(10.0)
+
+        summary = stats.summary()
+        self.assertEqual(summary['calls'], 103)
+        self.assertEqual(summary['errors'], 2)
+        self.assertAlmostEqual(summary['throughput'], 10.3)
+        self.assertAlmostEqual(summary['error_rate'], 2 / 103.0)
+        self.assertAlmostEqual(summary['p50'], 0.052)
+        self.assertEqual(summary['queue_p50'], 0.5)
+        self.assertEqual(dict(stats.errors), {u'wamp.error.canceled': 1, 'ValueError': 1})
+
+        # 20 sec. call ends up in the overflow bucket
+        self.assertEqual(stats.histogram[-1], 1)
+        self.assertEqual(stats.histogram[0], 5)
+        self.assertEqual(len(stats.queue_wait), 1)
+
+        stats.report(u'mdgroup.test.endpoint.call')
+
+    def test_report_histogram(self):
+
+        stats = LoadTestStats()
+        stats.start(0.0)
+        stats.record(0.01)
+        stats.stop(1.0)
+
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+
+        lg = logging.getLogger('clilogger')
+        level = lg.level
+        lg.addHandler(handler)
+        lg.setLevel(logging.INFO)
+        try:
+            stats.report(u'mdgroup.test.endpoint.call')
+        finally:
+            lg.removeHandler(handler)
+            lg.setLevel(level)
+
+        # Histogram reported without queue wait observations
+        self.assertIn('\nLatency histogram:', messages)
+
+
+@unittest.skipIf(not HAS_TWISTED, 'Twisted and MDStudio not available')
+class RunLoadTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.clock = task.Clock()
+        self.calls = 0
+
+    def stub_call(self, dispatched):
+
+        self.calls += 1
+        dispatched()
+        return task.deferLater(self.clock, 0.1, lambda: None)
+
+    def test_rate(self):
+
+        stats = LoadTestStats()
+        finished = run_load(self.stub_call, stats, 1.0, rate=10, clock=self.clock)
+        self.clock.pump([0.05] * 40)
+
+        self.assertTrue(finished.called)
+        self.assertEqual(self.calls, 10)
+        self.assertEqual(stats.calls, 10)
+
+    def test_rate_missed_ticks(self):
+
+        # Clock advancing slower than the call interval
+        stats = LoadTestStats()
+        finished = run_load(self.stub_call, stats, 1.0, rate=4, clock=self.clock)
+        self.clock.pump([0.375] * 4)
+
+        self.assertTrue(finished.called)
+        self.assertEqual(stats.calls, 4)
+
+    def test_concurrency(self):
+
+        stats = LoadTestStats()
+        finished = run_load(self.stub_call, stats, 1.0, concurrency=2, clock=self.clock)
+        self.clock.pump([0.05] * 40)
+
+        self.assertTrue(finished.called)
+        self.assertEqual(stats.calls, self.calls)
+        self.assertEqual(stats.calls, 20)
+
+    def test_queue_wait(self):
+
+        class SessionStub(object):
+
+            def call(session, uri, request):
+                return task.deferLater(self.clock, 0.25, lambda: request)
+
+        pool = SessionPool(max_outstanding=1)
+        pool.add(SessionStub())
+
+        def call(dispatched):
+            return pool_call(pool, u'stub', {}, dispatched=dispatched)
+
+        # Two calls in flight on a single session, one always waits
+        stats = LoadTestStats()
+        finished = run_load(call, stats, 1.0, concurrency=2, clock=self.clock)
+        self.clock.pump([0.125] * 24)
+
+        self.assertTrue(finished.called)
+        self.assertEqual(stats.latency.percentile(0), 0.25)
+        self.assertEqual(stats.latency.percentile(100), 0.25)
+        self.assertEqual(stats.queue_wait.percentile(0), 0.0)
+        self.assertGreaterEqual(stats.queue_wait.percentile(100), 0.125)
+
+    def test_pool_closed(self):
+
+        class SessionStub(object):
+
+            def call(session, uri, request):
+                return task.deferLater(self.clock, 0.25, lambda: request)
+
+        pool = SessionPool(max_outstanding=1)
+        pool.add(SessionStub())
+
+        results = []
+        failures = []
+        pool_call(pool, u'stub', 1).addCallbacks(results.append, failures.append)
+        pool_call(pool, u'stub', 2).addCallbacks(results.append, failures.append)
+
+        # Call waiting for a session fails, the running call completes
+        pool.close()
+        self.assertEqual(len(failures), 1)
+        failures[0].trap(IOError)
+
+        self.clock.advance(0.25)
+        self.assertEqual(results, [1])
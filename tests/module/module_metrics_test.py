@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI OpenMetrics export
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mdstudio_cli.metrics import MetricsRegistry
+
+
+class MetricsRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.registry = MetricsRegistry()
+        self.calls = self.registry.counter('test_calls', 'Endpoint calls')
+        self.errors = self.registry.counter('test_call_errors', 'Failed calls', labels=('error',))
+        self.latency = self.registry.histogram('test_call_seconds', 'Call latency', buckets=(0.1, 1.0, float('inf')))
+
+    def test_render(self):
+
+        self.calls.inc()
+        self.calls.inc(2)
+        self.errors.inc(error=u'wamp.error.canceled')
+        self.errors.inc(error=u'say "hi"')
+        for value in (0.05, 0.5, 0.5, 5.0):
+            self.latency.observe(value)
+
+        text = self.registry.render()
+        lines = text.splitlines()
+
+        self.assertIn('# TYPE test_calls counter', lines)
+        self.assertIn('test_calls_total 3', lines)
+        self.assertIn('test_call_errors_total{error="wamp.error.canceled"} 1', lines)
+        self.assertIn('test_call_errors_total{error="say \\"hi\\""} 1', lines)
+        self.assertIn('# TYPE test_call_seconds histogram', lines)
+        self.assertIn('test_call_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('test_call_seconds_bucket{le="1.0"} 3', lines)
+        self.assertIn('test_call_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn('test_call_seconds_count 4', lines)
+        self.assertIn('test_call_seconds_sum 6.05', lines)
+        self.assertEqual(lines[-1], '# EOF')
+
+    def test_write(self):
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'mdstudio_cli.prom')
+            self.calls.inc()
+            self.registry.write(path)
+
+            self.assertEqual(os.listdir(tmpdir), ['mdstudio_cli.prom'])
+            with open(path) as inf:
+                self.assertEqual(inf.read(), self.registry.render())
+        finally:
+            shutil.rmtree(tmpdir)
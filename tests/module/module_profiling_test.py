@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI --cli_profile option
+"""
+
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import unittest
+
+from mdstudio_cli.cli_parser import mdstudio_cli_parser
+from mdstudio_cli.profiling import profiled
+
+
+def workload():
+
+    return [str(i) * 10 for i in range(10000)]
+
+
+class ProfilingTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.summary_file = os.path.join(self.tmpdir, 'summary.txt')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmpdir)
+
+    def run_profiled(self, kind, path):
+
+        with open(self.summary_file, 'w') as stream:
+            with profiled(kind, path=path, top=5, stream=stream):
+                data = workload()
+
+        with open(self.summary_file) as inf:
+            return data, inf.read()
+
+    def test_cpu(self):
+
+        path = os.path.join(self.tmpdir, 'run.pstats')
+        _, summary = self.run_profiled(u'cpu', path)
+
+        self.assertIn('cpu profile written to {0}'.format(path), summary)
+        self.assertIn('workload', summary)
+        self.assertTrue(any(func[2] == 'workload' for func in pstats.Stats(path).stats))
+
+    @unittest.skipIf(sys.version_info < (3, 4), 'tracemalloc requires Python 3.4')
+    def test_mem(self):
+
+        import tracemalloc
+
+        path = os.path.join(self.tmpdir, 'run.tracemalloc')
+        _, summary = self.run_profiled(u'mem', path)
+
+        self.assertIn('Peak traced memory', summary)
+        self.assertIn('module_profiling_test.py', summary)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertTrue(len(tracemalloc.Snapshot.load(path).traces) > 0)
+
+    def test_written_on_exit(self):
+
+        path = os.path.join(self.tmpdir, 'run.pstats')
+        with open(self.summary_file, 'w') as stream:
+            with self.assertRaises(SystemExit):
+                with profiled(u'cpu', path=path, stream=stream):
+                    sys.exit(1)
+
+        self.assertTrue(os.path.isfile(path))
+
+    def test_parser(self):
+
+        config = mdstudio_cli_parser(['-u', 'mdgroup.lie_structures.endpoint.convert', '--cli_profile', 'mem'])
+        self.assertEqual(config['profile'], u'mem')
+        self.assertIsNone(config['profile_output'])
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI compiled schema graph cache
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from mdstudio_cli import schema_cache
+from mdstudio_cli.schema_cache import SchemaGraphCache, schema_digest
+
+try:
+    from graphit.graph_io.io_jsonschema_format import read_json_schema
+    from mdstudio_cli.schema_classes import CLIORM
+    HAS_GRAPHIT = True
+except ImportError:
+    HAS_GRAPHIT = False
+
+
+class Graph(object):
+    """
+    Picklable stand-in for a compiled schema graph
+    """
+
+    compiled = 0
+    loaded = 0
+
+    def __init__(self, schema):
+
+        Graph.compiled += 1
+        self.schema = schema
+        self.orm = lambda node: node
+
+    def __setstate__(self, state):
+
+        Graph.loaded += 1
+        self.__dict__.update(state)
+
+
+class SchemaGraphCacheTests(unittest.TestCase):
+
+    uri = u'mdgroup.lie_structures.endpoint.convert'
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.orm = object()
+        self.schema = {u'type': u'object', u'properties': {u'mol': {u'type': u'string', u'format': u'file'}}}
+        Graph.compiled = 0
+        Graph.loaded = 0
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmpdir)
+
+    def cache_files(self):
+
+        return [os.path.join(root, name) for root, _, files in os.walk(self.tmpdir) for name in files]
+
+    def test_session_reuse(self):
+
+        cache = SchemaGraphCache(orm=self.orm, path=self.tmpdir)
+        first = cache.get(self.uri, self.schema, Graph)
+        second = cache.get(self.uri, self.schema, Graph)
+
+        self.assertEqual(Graph.compiled, 1)
+        self.assertIsNot(first, second)
+        self.assertIs(second.orm, self.orm)
+        self.assertEqual(second.schema, self.schema)
+
+    def test_persisted(self):
+
+        SchemaGraphCache(path=self.tmpdir).get(self.uri, self.schema, Graph)
+        graph = SchemaGraphCache(orm=self.orm, path=self.tmpdir).get(self.uri, dict(self.schema), Graph)
+
+        # Graph loaded from the cache file is used directly
+        self.assertEqual(Graph.compiled, 1)
+        self.assertEqual(Graph.loaded, 1)
+        self.assertEqual(graph.schema, self.schema)
+        self.assertEqual(self.cache_files(), [os.path.join(self.tmpdir, self.uri,
+                                                           '{0}.pickle'.format(schema_digest(self.schema)))])
+
+    def test_graphit_version(self):
+
+        digest = schema_digest(self.schema)
+
+        version = schema_cache.GRAPHIT_VERSION
+        schema_cache.GRAPHIT_VERSION = (0, 0, 1)
+        try:
+            self.assertNotEqual(schema_digest(self.schema), digest)
+        finally:
+            schema_cache.GRAPHIT_VERSION = version
+
+    def test_schema_changed(self):
+
+        SchemaGraphCache(path=self.tmpdir).get(self.uri, self.schema, Graph)
+        changed = dict(self.schema, required=[u'mol'])
+        graph = SchemaGraphCache(path=self.tmpdir).get(self.uri, changed, Graph)
+
+        self.assertEqual(Graph.compiled, 2)
+        self.assertEqual(graph.schema, changed)
+        self.assertEqual(len(self.cache_files()), 1)
+
+    def test_corrupt_cache_file(self):
+
+        SchemaGraphCache(path=self.tmpdir).get(self.uri, self.schema, Graph)
+        with open(self.cache_files()[0], 'wb') as outf:
+            outf.write(b'corrupt')
+
+        graph = SchemaGraphCache(path=self.tmpdir).get(self.uri, self.schema, Graph)
+
+        self.assertEqual(Graph.compiled, 2)
+        self.assertEqual(graph.schema, self.schema)
+
+    def test_unpicklable_graph(self):
+
+        def compiler(schema):
+            graph = Graph(schema)
+            graph.handle = lambda: None
+            return graph
+
+        cache = SchemaGraphCache(orm=self.orm, path=self.tmpdir)
+        cache.get(self.uri, self.schema, compiler)
+        graph = cache.get(self.uri, self.schema, compiler)
+
+        self.assertEqual(Graph.compiled, 2)
+        self.assertIs(graph.orm, self.orm)
+        self.assertEqual(self.cache_files(), [])
+
+
+@unittest.skipUnless(HAS_GRAPHIT, 'graphit not available')
+class GraphitSchemaGraphCacheTests(unittest.TestCase):
+
+    uri = u'mdgroup.lie_structures.endpoint.convert'
+    schema = {u'type': u'object', u'properties': {u'count': {u'type': u'integer'},
+                                                  u'name': {u'type': u'string'}}}
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+
+        SchemaGraphCache(orm=CLIORM, path=self.tmpdir).get(self.uri, self.schema, read_json_schema)
+
+        # Pickled without ORM
+        cache_file = os.path.join(self.tmpdir, self.uri, '{0}.pickle'.format(schema_digest(self.schema)))
+        with open(cache_file, 'rb') as inf:
+            self.assertIsNone(pickle.load(inf).orm)
+
+        def compiler(schema):
+            raise AssertionError('graph compiled instead of loaded from cache')
+
+        cache = SchemaGraphCache(orm=CLIORM, path=self.tmpdir)
+        first = cache.get(self.uri, self.schema, compiler)
+        second = cache.get(self.uri, self.schema, compiler)
+
+        # ORM reattached to the loaded graph
+        self.assertIs(first.orm, CLIORM)
+        count = first.query_nodes(key=u'count')
+        count.set(first.data.value_tag, u'3')
+        self.assertEqual(count.get(first.data.value_tag), 3)
+
+        # Graphs are independent
+        self.assertIsNone(second.query_nodes(key=u'count').get(second.data.value_tag))
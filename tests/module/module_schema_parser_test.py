@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI endpoint schema retrieval
+"""
+
+import unittest
+
+from mdstudio_cli.call_policy import CallPolicy
+
+try:
+    from twisted.internet import defer
+    from mdstudio_cli.schema_parser import SchemaParser, dict_to_schema_uri
+    HAS_MDSTUDIO = True
+except ImportError:
+    HAS_MDSTUDIO = False
+
+RESOURCE = u'resource://mdgroup/common/mol/v1'
+
+
+class StubSession(object):
+    """
+    Session answering schema requests when completed by the test
+    """
+
+    def __init__(self):
+        self.requests = []
+
+    def group_context(self, group):
+        return self
+
+    def call(self, procedure, request, claims=None):
+        deferred = defer.Deferred()
+        self.requests.append((dict_to_schema_uri(request), deferred))
+        return deferred
+
+    def respond(self, uri, schema):
+        for request_uri, deferred in self.requests:
+            if request_uri == uri and not deferred.called:
+                deferred.callback(schema)
+
+
+@unittest.skipUnless(HAS_MDSTUDIO, 'Twisted and MDStudio not available')
+class SchemaParserTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.session = StubSession()
+        self.parser = SchemaParser(self.session, policy=CallPolicy(), vendor=u'mdgroup')
+
+    def get(self, uri):
+
+        results = []
+        self.parser.get(uri=uri, request=True, clean_cache=False).addCallback(results.append)
+        return results
+
+    def test_concurrent_requests(self):
+
+        first = self.get(u'mdgroup.lie_structures.endpoint.convert')
+        second = self.get(u'mdgroup.lie_structures.endpoint.convert')
+        other = self.get(u'mdgroup.lie_structures.endpoint.info')
+
+        ref = {u'type': u'object', u'properties': {u'mol': {u'$ref': RESOURCE}}}
+        self.session.respond(u'endpoint://mdgroup/lie_structures/convert_request/v1', ref)
+        self.session.respond(u'endpoint://mdgroup/lie_structures/info_request/v1', dict(ref))
+        self.session.respond(RESOURCE, {u'properties': {u'content': {u'type': u'string'}}})
+
+        # Every schema is requested once, shared resources included
+        self.assertEqual(sorted(uri for uri, _ in self.session.requests),
+                         [u'endpoint://mdgroup/lie_structures/convert_request/v1',
+                          u'endpoint://mdgroup/lie_structures/info_request/v1', RESOURCE])
+
+        self.assertEqual(len(first + second + other), 3)
+        self.assertEqual(first, second)
+        self.assertIn(u'content', first[0][u'properties'][u'mol'][u'properties'])
+        self.assertEqual(self.parser._schema_requests, {})
+
+    def test_failure(self):
+
+        failures = []
+        for _ in range(2):
+            self.parser.get(uri=u'mdgroup.lie_structures.endpoint.convert', request=True,
+                            clean_cache=False).addErrback(failures.append)
+
+        self.session.requests[0][1].errback(ValueError('no such endpoint'))
+
+        self.assertEqual(len(failures), 2)
+        self.assertEqual(len(self.session.requests), 1)
+        self.assertEqual(self.parser._schema_requests, {})
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI session pool scheduler
+"""
+
+import unittest
+
+from mdstudio_cli.session_pool import SessionPool
+
+
+class SessionStub(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class SessionPoolTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.sessions = [SessionStub('a'), SessionStub('b')]
+        self.pool = SessionPool(max_outstanding=2)
+        for session in self.sessions:
+            self.pool.add(session)
+
+        self.assigned = []
+
+    def test_least_outstanding(self):
+
+        for _ in range(4):
+            self.pool.acquire(self.assigned.append)
+
+        self.assertEqual([s.name for s in self.assigned], ['a', 'b', 'a', 'b'])
+        self.assertEqual(self.pool.outstanding(), 4)
+
+        # Session 'b' finished a request and is least busy
+        self.pool.release(self.sessions[1])
+        self.pool.acquire(self.assigned.append)
+        self.assertEqual(self.assigned[-1].name, 'b')
+
+    def test_flow_control(self):
+
+        for _ in range(6):
+            self.pool.acquire(self.assigned.append)
+
+        self.assertEqual(len(self.assigned), 4)
+        self.assertEqual(self.pool.waiting, 2)
+
+        # Waiting requests are dispatched once a session is released
+        self.pool.release(self.sessions[0])
+        self.assertEqual(len(self.assigned), 5)
+        self.assertEqual(self.assigned[-1].name, 'a')
+
+        # Or when a session joins the pool
+        self.pool.add(SessionStub('c'))
+        self.assertEqual(len(self.assigned), 6)
+        self.assertEqual(self.assigned[-1].name, 'c')
+        self.assertEqual(self.pool.waiting, 0)
+
+    def test_discard(self):
+
+        for _ in range(4):
+            self.pool.acquire(self.assigned.append)
+
+        waiting = []
+        self.pool.acquire(waiting.append)
+        self.assertTrue(self.pool.discard(waiting.append))
+        self.assertFalse(self.pool.discard(waiting.append))
+
+        self.pool.release(self.sessions[0])
+        self.assertEqual(waiting, [])
+
+    def test_remove(self):
+
+        self.pool.remove(self.sessions[0])
+        self.assertEqual(len(self.pool), 1)
+
+        for _ in range(2):
+            self.pool.acquire(self.assigned.append)
+        self.assertEqual([s.name for s in self.assigned], ['b', 'b'])
+
+    def test_close(self):
+
+        self.assertEqual(self.pool.close(), self.sessions)
+        self.assertEqual(len(self.pool), 0)
+
+        # Sessions joining a closed pool are refused, new requests fail
+        self.assertFalse(self.pool.add(SessionStub('c')))
+        self.assertRaises(IOError, self.pool.acquire, self.assigned.append)
+
+    def test_close_waiting(self):
+
+        for _ in range(5):
+            self.pool.acquire(self.assigned.append)
+
+        # Waiting request is called without a session
+        self.pool.close()
+        self.assertEqual(self.assigned[4:], [None])
+        self.assertEqual(self.pool.waiting, 0)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI session setup shared by both backends
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from graphit.graph_io.io_jsonschema_format import read_json_schema
+
+from mdstudio_cli.call_policy import CallTimeout
+from mdstudio_cli.cli_parser import SESSION_DEFAULTS, mdstudio_cli_parser
+from mdstudio_cli.schema_classes import CLIORM
+from mdstudio_cli.session_setup import CLIENT_DEFAULTS, setup_session
+
+FILE_SCHEMA = {u'type': u'object', u'properties': {u'mol': {u'type': u'object', u'format': u'file', u'properties': {
+    u'content': {u'type': u'string'}, u'path': {u'type': u'string'}, u'extension': {u'type': u'string'},
+    u'encoding': {u'type': u'string'}}}}}
+
+
+class Session(object):
+    pass
+
+
+class SetupSessionTests(unittest.TestCase):
+
+    def test_setup(self):
+
+        session = Session()
+        schema_policy = setup_session(session, {u'call_timeout': 5.0, u'schema_timeout': 30.0, u'max_inflight': 2,
+                                                u'spill_threshold': 1, u'coalesce': True})
+
+        self.assertEqual(session.call_policy.timeout, 5.0)
+        self.assertEqual(schema_policy.timeout, 30.0)
+        self.assertEqual(session.budget.max_bytes, 2 * 1024 * 1024)
+        self.assertEqual(session.spill_threshold, 1024 * 1024)
+        self.assertTrue(session.coalesce)
+        self.assertEqual(session._inflight, {})
+
+    def test_unlimited(self):
+
+        session = Session()
+        setup_session(session, {u'max_inflight': 0}, retry_exceptions=(CallTimeout, IOError))
+
+        self.assertIsNone(session.budget.max_bytes)
+        self.assertIsNone(session.spill_threshold)
+        self.assertFalse(session.coalesce)
+        self.assertEqual(session.call_policy.retry_exceptions, (CallTimeout, IOError))
+
+
+class SessionDefaultsTests(unittest.TestCase):
+
+    def test_defaults(self):
+
+        config = mdstudio_cli_parser(['-u', 'mdgroup.lie_structures.endpoint.convert'])
+
+        for key, value in SESSION_DEFAULTS.items():
+            self.assertEqual(config[key], value)
+            self.assertEqual(CLIENT_DEFAULTS[key], value)
+
+
+class SessionFileCacheTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'mol.pdb')
+        with open(self.path, 'w') as outf:
+            outf.write('ATOM')
+
+    def tearDown(self):
+
+        shutil.rmtree(self.tmpdir)
+
+    def bind(self, file_cache):
+
+        request = read_json_schema(FILE_SCHEMA)
+        request.orm = CLIORM
+        if file_cache is not None:
+            request.data['file_cache'] = file_cache
+
+        mol = request.query_nodes(key=u'mol')
+        mol.set(request.data.value_tag, self.path)
+
+        return mol.get(request.data.value_tag)
+
+    def test_per_session(self):
+
+        first, second = Session(), Session()
+        setup_session(first, {u'file_cache': 1})
+        setup_session(second, {u'file_cache': 1})
+
+        self.assertIsNot(first.file_cache, second.file_cache)
+
+        self.bind(first.file_cache)
+        self.bind(first.file_cache)
+        self.assertEqual((first.file_cache.hits, first.file_cache.misses), (1, 1))
+        self.assertEqual(len(second.file_cache), 0)
+
+        # Setting up another session leaves the cache intact
+        setup_session(Session(), {u'file_cache': 1})
+        self.assertEqual(len(first.file_cache), 1)
+
+    def test_no_cache(self):
+
+        self.assertEqual(self.bind(None)[u'content'], 'ATOM')
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for the MDStudio CLI Twisted session pool lifecycle
+"""
+
+import unittest
+
+try:
+    from twisted.internet import defer
+    from mdstudio_cli.call_policy import CallPolicy, LatencyTracker
+    from mdstudio_cli.metrics import UPLOADED_BYTES
+    from mdstudio_cli.session_pool import SessionPool
+    from mdstudio_cli.wamp_services import CliWampApi, PoolMemberSession
+    HAS_TWISTED = True
+except (ImportError, RuntimeError):
+    # RuntimeError: autobahn already bound to asyncio by the asyncio client
+    # tests run in the same process
+    HAS_TWISTED = False
+
+
+class ConfigStub(object):
+
+    def __init__(self, **extra):
+        self.extra = extra
+        self.static = {}
+
+
+class PoolSessionStub(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def disconnect(self):
+        self.closed = True
+
+
+if HAS_TWISTED:
+    class PoolMemberStub(PoolMemberSession):
+        """
+        Pool member session not connected to a router
+        """
+
+        config = None
+
+        def __init__(self, pool):
+            self.config = ConfigStub(pool=pool)
+            self.left = False
+
+        def leave(self, *args, **kwargs):
+            self.left = True
+
+    class CliSessionStub(CliWampApi):
+        """
+        CLI session not connected to a router
+        """
+
+        config = None
+
+        def __init__(self, **extra):
+            self.config = ConfigStub(**extra)
+
+
+@unittest.skipUnless(HAS_TWISTED, 'Twisted and MDStudio not available or autobahn bound to asyncio')
+class SessionPoolLifecycleTests(unittest.TestCase):
+
+    def setUp(self):
+
+        # Session methods under test do not require a router connection
+        self.session = CliWampApi.__new__(CliWampApi)
+        self.session.component_config = ConfigStub()
+
+    def test_lazy_open(self):
+
+        self.assertIsNone(self.session.pool)
+
+        pool = self.session.open_pool()
+        self.assertEqual(pool.sessions, [self.session])
+        self.assertIs(self.session.open_pool(), pool)
+
+    def test_close_connecting(self):
+
+        pool = self.session.open_pool()
+        member = PoolSessionStub()
+        pool.add(member)
+
+        cancelled = []
+        connecting = defer.Deferred(cancelled.append)
+        connecting.addErrback(lambda failure: failure.trap(defer.CancelledError))
+        self.session.pool_connecting = [connecting, defer.succeed(None)]
+        self.session.close_pool()
+
+        self.assertEqual(len(cancelled), 1)
+        self.assertTrue(member.closed)
+        self.assertTrue(pool.closed)
+
+    def test_join_after_close(self):
+
+        pool = SessionPool()
+        pool.close()
+
+        member = PoolMemberStub(pool)
+        member.on_run()
+
+        self.assertTrue(member.left)
+        self.assertEqual(len(pool), 0)
+
+
+@unittest.skipUnless(HAS_TWISTED, 'Twisted and MDStudio not available or autobahn bound to asyncio')
+class RunStatusTests(unittest.TestCase):
+
+    def setUp(self):
+
+        self.status = {}
+        self.session = CliSessionStub(run_status=self.status)
+
+    def test_error(self):
+
+        closed = []
+        self.session.close_session = lambda: closed.append(self.session.set_run_status(True))
+        self.session.error_callback(IOError('Unable to join realm'))
+
+        # Failure is kept when closing the session
+        self.assertEqual(self.status, {'succeeded': False})
+        self.assertEqual(len(closed), 1)
+
+    def test_no_status(self):
+
+        CliSessionStub().set_run_status(True)
+
+
+@unittest.skipUnless(HAS_TWISTED, 'Twisted and MDStudio not available or autobahn bound to asyncio')
+class UploadedBytesTests(unittest.TestCase):
+
+    def test_counted_at_dispatch(self):
+
+        session = CliWampApi.__new__(CliWampApi)
+        session.component_config = ConfigStub()
+        session.component_config.static = {'cli_pool': {'max_outstanding': 1}}
+        session.call_policy = CallPolicy()
+        session.latency = LatencyTracker()
+
+        calls = []
+
+        def call(uri, request):
+            calls.append(defer.Deferred())
+            return calls[-1]
+
+        session.call = call
+
+        endpoint_input = {u'mol': {u'content': u'\u00c5TOM', u'extension': u'pdb', u'encoding': u'utf8',
+                                   u'path': None}}
+        uploaded = UPLOADED_BYTES.value()
+
+        session.call_bound(u'mdgroup.test.endpoint.call', endpoint_input)
+        session.call_bound(u'mdgroup.test.endpoint.call', endpoint_input)
+
+        # Second call waits for the session and is not sent yet
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(UPLOADED_BYTES.value() - uploaded, 5)
+
+        calls[0].callback({})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(UPLOADED_BYTES.value() - uploaded, 10)
+
+        calls[1].callback({})